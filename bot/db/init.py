@@ -1,11 +1,36 @@
 from __future__ import annotations
 
-from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy import inspect, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
 
 from bot.db.base import Base
 
+# Колонки, добавленные в модели после первых деплоев: create_all в существующую
+# таблицу их не добавит. (таблица, колонка, тип PostgreSQL, тип SQLite)
+ADDED_COLUMNS = [
+    ("price_history", "last_seen_at", "TIMESTAMP WITH TIME ZONE", "DATETIME"),
+]
+
+
 async def init_db(engine: AsyncEngine) -> None:
     from bot.db import models  # noqa: F401
 
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await add_missing_columns(conn)
+
+
+async def add_missing_columns(conn: AsyncConnection) -> list[str]:
+    """Добавляет недостающие колонки из ADDED_COLUMNS. Возвращает добавленные."""
+    added: list[str] = []
+    for table, column, pg_type, sqlite_type in ADDED_COLUMNS:
+        columns = await conn.run_sync(lambda c, t=table: {col["name"] for col in inspect(c).get_columns(t)})
+        if column in columns:
+            continue
+
+        if conn.dialect.name == "postgresql":
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS {column} {pg_type}"))
+        else:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {sqlite_type}"))
+        added.append(f"{table}.{column}")
+    return added
@@ -30,6 +30,9 @@ class PriceHistory(Base):
     rating: Mapped[float | None] = mapped_column(nullable=True)
 
     checked_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    # Сжатая история (PRICE_HISTORY_COMPRESSED): значения строки действуют
+    # с checked_at по last_seen_at; None — строка из обычного режима
+    last_seen_at: Mapped[datetime | None] = mapped_column(DateTime(timezone=True), nullable=True)
 
     product = relationship("Product", back_populates="price_history")
 
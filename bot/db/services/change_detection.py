@@ -2,12 +2,15 @@
 
 from __future__ import annotations
 
+import os
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from decimal import Decimal
 from typing import Any
 
-from sqlalchemy import select
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from bot.db.models import Platform, PlatformCode, Product
@@ -17,6 +20,23 @@ from bot.db.models.price_history import PriceHistory
 # Минимум парсингов для стабилизации
 MIN_STABLE_PARSE_COUNT = 2
 
+# Пакетная запись (upsert) вместо ORM-объекта на каждый товар
+BULK_UPSERT_ENABLED = os.getenv("DETECT_BULK_UPSERT", "true").lower() in ("1", "true", "yes")
+# Строк на один запрос (лимит параметров: PG 65535, SQLite 32766)
+BULK_CHUNK_SIZE = int(os.getenv("DETECT_BULK_CHUNK_SIZE", "1000"))
+# История цен только по изменениям: новая строка — когда изменились
+# price/old_price/discount/stock/rating, иначе продлевается last_seen_at
+# последней строки (колонку добавляет init_db при старте)
+PRICE_HISTORY_COMPRESSED = os.getenv("PRICE_HISTORY_COMPRESSED", "false").lower() in ("1", "true", "yes")
+
+# Поля истории, изменение которых открывает новую строку
+_HISTORY_FIELDS = ("price", "old_price", "discount", "stock", "rating")
+
+_DIALECT_INSERT = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
 
 @dataclass
 class FieldChange:
@@ -70,6 +90,226 @@ def _has_complete_data(item: dict[str, Any]) -> bool:
         return False
 
 
+# Поля товара, которые пересчитываются на каждом цикле (всё, кроме ключей)
+_STATE_FIELDS = (
+    "title",
+    "url",
+    "current_price",
+    "old_price",
+    "discount",
+    "stock",
+    "rating",
+    "last_checked_at",
+    "stable_parse_count",
+    "is_stable",
+    "baseline_price",
+    "baseline_discount",
+    "baseline_set_at",
+    "dead_check_fail_count",
+    "last_dead_reason",
+)
+
+
+def _new_state(external_id: str, item: dict[str, Any], now: datetime) -> dict[str, Any]:
+    """Состояние нового товара."""
+    return {
+        "title": item.get("name") or item.get("title") or f"Товар {external_id}",
+        "url": item.get("product_url"),
+        "current_price": _to_decimal(item.get("price")),
+        "old_price": _to_decimal(item.get("old_price")),
+        "discount": _to_float(item.get("discount_percent")),
+        "stock": item.get("stock"),
+        "rating": _to_float(item.get("rating")),
+        "last_checked_at": now,
+        "stable_parse_count": 1 if _has_complete_data(item) else 0,
+        "is_stable": False,
+        "baseline_price": None,
+        "baseline_discount": None,
+        "baseline_set_at": None,
+        "dead_check_fail_count": 0,
+        "last_dead_reason": None,
+    }
+
+
+def _update_state(state: dict[str, Any], item: dict[str, Any], now: datetime) -> tuple[list[FieldChange], bool]:
+    """
+    Применяет результат парсинга к состоянию существующего товара (меняет state).
+
+    Возвращает (изменения, just_stabilized).
+    """
+    new_price = _to_decimal(item.get("price"))
+    new_old_price = _to_decimal(item.get("old_price"))
+    new_discount = _to_float(item.get("discount_percent"))
+    new_stock = item.get("stock")
+    new_rating = _to_float(item.get("rating"))
+    just_stabilized = False
+
+    # === DEAD-check для OZON/общий: учитываем ошибки парсинга ===
+    err = item.get("error")
+    err_str = str(err) if err is not None else None
+
+    # Если товар "ожил" (есть цена) — сбрасываем счётчик
+    if new_price is not None and new_price > 0:
+        state["dead_check_fail_count"] = 0
+        state["last_dead_reason"] = None
+    else:
+        # Увеличиваем счётчик только для "фатальных" причин (удалён)
+        if err_str in ("404", "410"):
+            state["dead_check_fail_count"] = (state["dead_check_fail_count"] or 0) + 1
+            state["last_dead_reason"] = err_str
+
+    # Обновляем счётчик стабильности
+    if _has_complete_data(item):
+        state["stable_parse_count"] = (state["stable_parse_count"] or 0) + 1
+
+    # Проверяем, нужно ли стабилизировать
+    was_stable = state["is_stable"]
+    if not was_stable and (state["stable_parse_count"] or 0) >= MIN_STABLE_PARSE_COUNT:
+        state["is_stable"] = True
+        state["baseline_price"] = new_price
+        state["baseline_discount"] = new_discount
+        state["baseline_set_at"] = now
+        just_stabilized = True
+
+    # === Детекция изменений (только для стабильных товаров) ===
+    changes: list[FieldChange] = []
+
+    if state["is_stable"] and not just_stabilized:
+        # Сравниваем с baseline
+        baseline_price = state["baseline_price"]
+        baseline_discount = state["baseline_discount"]
+
+        # Изменение цены
+        if baseline_price is not None and new_price is not None:
+            if new_price != baseline_price:
+                changes.append(FieldChange(
+                    field="price",
+                    old=baseline_price,
+                    new=new_price,
+                ))
+                # Обновляем baseline при изменении
+                state["baseline_price"] = new_price
+                state["baseline_set_at"] = now
+
+        # Изменение скидки
+        if baseline_discount is not None and new_discount is not None:
+            if abs(new_discount - baseline_discount) >= 1.0:
+                changes.append(FieldChange(
+                    field="discount",
+                    old=baseline_discount,
+                    new=new_discount,
+                ))
+                state["baseline_discount"] = new_discount
+
+    # === Обновляем текущие значения в любом случае ===
+    if new_price is not None:
+        state["current_price"] = new_price
+    if new_old_price is not None:
+        state["old_price"] = new_old_price
+    if new_discount is not None:
+        state["discount"] = new_discount
+    if new_stock is not None:
+        state["stock"] = new_stock
+    if new_rating is not None:
+        state["rating"] = new_rating
+
+    state["last_checked_at"] = now
+
+    # Обновляем title/url если пришли
+    if item.get("name") or item.get("title"):
+        state["title"] = item.get("name") or item.get("title")
+    if item.get("product_url"):
+        state["url"] = item.get("product_url")
+
+    return changes, just_stabilized
+
+
+def _history_values(item: dict[str, Any], now: datetime) -> dict[str, Any] | None:
+    """Строка истории цен (без product_id); None — цены нет, не пишем."""
+    price = _to_decimal(item.get("price"))
+    if price is None:
+        return None
+    return {
+        "price": price,
+        "old_price": _to_decimal(item.get("old_price")),
+        "discount": _to_float(item.get("discount_percent")),
+        "stock": item.get("stock"),
+        "rating": _to_float(item.get("rating")),
+        "checked_at": now,
+    }
+
+
+async def _save_history(
+    session: AsyncSession,
+    history_items: list[tuple[int, dict[str, Any]]],
+    now: datetime,
+) -> None:
+    """
+    Пишет историю цен: history_items — (product_id, значения).
+
+    В сжатом режиме строка пишется только при изменении значений
+    относительно последней строки товара; совпавшим продлевается last_seen_at.
+    """
+    if not history_items:
+        return
+
+    if not PRICE_HISTORY_COMPRESSED:
+        rows = [{"product_id": product_id, **values} for product_id, values in history_items]
+        for i in range(0, len(rows), BULK_CHUNK_SIZE):
+            await session.execute(insert(PriceHistory), rows[i:i + BULK_CHUNK_SIZE])
+        return
+
+    # Последняя строка истории каждого товара
+    product_ids = list({product_id for product_id, _ in history_items})
+    latest: dict[int, Any] = {}
+    for i in range(0, len(product_ids), BULK_CHUNK_SIZE):
+        last_ids = (
+            select(func.max(PriceHistory.id))
+            .where(PriceHistory.product_id.in_(product_ids[i:i + BULK_CHUNK_SIZE]))
+            .group_by(PriceHistory.product_id)
+        )
+        stmt = select(
+            PriceHistory.id,
+            PriceHistory.product_id,
+            *(getattr(PriceHistory, f) for f in _HISTORY_FIELDS),
+        ).where(PriceHistory.id.in_(last_ids))
+        for row in (await session.execute(stmt)).mappings():
+            latest[row["product_id"]] = row
+
+    rows: list[dict[str, Any]] = []
+    seen_ids: list[int] = []
+    for product_id, values in history_items:
+        last = latest.get(product_id)
+        if last is not None and all(last[f] == values[f] for f in _HISTORY_FIELDS):
+            seen_ids.append(last["id"])
+        else:
+            rows.append({"product_id": product_id, **values, "last_seen_at": now})
+
+    for i in range(0, len(rows), BULK_CHUNK_SIZE):
+        await session.execute(insert(PriceHistory), rows[i:i + BULK_CHUNK_SIZE])
+
+    for i in range(0, len(seen_ids), BULK_CHUNK_SIZE):
+        await session.execute(
+            update(PriceHistory)
+            .where(PriceHistory.id.in_(seen_ids[i:i + BULK_CHUNK_SIZE]))
+            .values(last_seen_at=now)
+            .execution_options(synchronize_session=False)
+        )
+
+
+async def _get_or_create_platform(session: AsyncSession, platform_code: PlatformCode) -> Platform:
+    stmt = select(Platform).where(Platform.code == platform_code)
+    result = await session.execute(stmt)
+    platform = result.scalar_one_or_none()
+
+    if not platform:
+        platform = Platform(code=platform_code, name=platform_code.value)
+        session.add(platform)
+        await session.flush()
+
+    return platform
+
+
 async def detect_and_save_changes(
     session: AsyncSession,
     *,
@@ -87,20 +327,28 @@ async def detect_and_save_changes(
        - baseline_price/baseline_discount фиксируются
     4. Изменения детектируются только для стабильных товаров
     5. Сравнение идёт с baseline (не с предыдущим значением)
+
+    На PostgreSQL/SQLite запись идёт пачками (upsert товаров + insert истории),
+    на остальных БД — через ORM.
     """
 
     if not items:
         return []
 
-    # Получаем платформу
-    stmt = select(Platform).where(Platform.code == platform_code)
-    result = await session.execute(stmt)
-    platform = result.scalar_one_or_none()
+    platform = await _get_or_create_platform(session, platform_code)
+
+    dialect = session.get_bind().dialect.name
+    if BULK_UPSERT_ENABLED and dialect in _DIALECT_INSERT:
+        return await _save_bulk(session, platform, items, dialect)
+    return await _save_orm(session, platform, items)
 
-    if not platform:
-        platform = Platform(code=platform_code, name=platform_code.value)
-        session.add(platform)
-        await session.flush()
+
+async def _save_orm(
+    session: AsyncSession,
+    platform: Platform,
+    items: list[dict[str, Any]],
+) -> list[ChangeResult]:
+    """Запись через ORM (по объекту на товар)."""
 
     # Собираем external_id
     external_ids = [str(it.get("external_id")) for it in items if it.get("external_id")]
@@ -115,6 +363,7 @@ async def detect_and_save_changes(
 
     now = datetime.now(timezone.utc)
     results: list[ChangeResult] = []
+    history_items: list[tuple[int, dict[str, Any]]] = []
 
     for item in items:
         external_id = str(item.get("external_id", ""))
@@ -122,29 +371,13 @@ async def detect_and_save_changes(
             continue
 
         product = existing_products.get(external_id)
-        is_new = product is None
-        just_stabilized = False
 
         # === Создание нового товара ===
-        if is_new:
+        if product is None:
             product = Product(
                 platform_id=platform.id,
                 external_id=external_id,
-                title=item.get("name") or item.get("title") or f"Товар {external_id}",
-                url=item.get("product_url"),
-                current_price=_to_decimal(item.get("price")),
-                old_price=_to_decimal(item.get("old_price")),
-                discount=_to_float(item.get("discount_percent")),
-                stock=item.get("stock"),
-                rating=_to_float(item.get("rating")),
-                last_checked_at=now,
-                stable_parse_count=1 if _has_complete_data(item) else 0,
-                is_stable=False,
-                baseline_price=None,
-                baseline_discount=None,
-                baseline_set_at=None,
-                dead_check_fail_count=0,
-                last_dead_reason=None,
+                **_new_state(external_id, item, now),
             )
             session.add(product)
 
@@ -158,102 +391,15 @@ async def detect_and_save_changes(
             continue
 
         # === Обновление существующего товара ===
-
-        new_price = _to_decimal(item.get("price"))
-        new_old_price = _to_decimal(item.get("old_price"))
-        new_discount = _to_float(item.get("discount_percent"))
-        new_stock = item.get("stock")
-        new_rating = _to_float(item.get("rating"))
-
-        # === DEAD-check для OZON/общий: учитываем ошибки парсинга ===
-        err = item.get("error")
-        err_str = str(err) if err is not None else None
-
-        # Если товар "ожил" (есть цена) — сбрасываем счётчик
-        if new_price is not None and new_price > 0:
-            product.dead_check_fail_count = 0
-            product.last_dead_reason = None
-        else:
-            # Увеличиваем счётчик только для "фатальных" причин (удалён)
-            if err_str in ("404", "410"):
-                product.dead_check_fail_count = (product.dead_check_fail_count or 0) + 1
-                product.last_dead_reason = err_str
-
-        # Обновляем счётчик стабильности
-        if _has_complete_data(item):
-            product.stable_parse_count = (product.stable_parse_count or 0) + 1
-
-        # Проверяем, нужно ли стабилизировать
-        was_stable = product.is_stable
-        if not was_stable and (product.stable_parse_count or 0) >= MIN_STABLE_PARSE_COUNT:
-            product.is_stable = True
-            product.baseline_price = new_price
-            product.baseline_discount = new_discount
-            product.baseline_set_at = now
-            just_stabilized = True
-
-        # === Детекция изменений (только для стабильных товаров) ===
-        changes: list[FieldChange] = []
-
-        if product.is_stable and not just_stabilized:
-            # Сравниваем с baseline
-            baseline_price = product.baseline_price
-            baseline_discount = product.baseline_discount
-
-            # Изменение цены
-            if baseline_price is not None and new_price is not None:
-                if new_price != baseline_price:
-                    changes.append(FieldChange(
-                        field="price",
-                        old=baseline_price,
-                        new=new_price,
-                    ))
-                    # Обновляем baseline при изменении
-                    product.baseline_price = new_price
-                    product.baseline_set_at = now
-
-            # Изменение скидки
-            if baseline_discount is not None and new_discount is not None:
-                if abs(new_discount - baseline_discount) >= 1.0:
-                    changes.append(FieldChange(
-                        field="discount",
-                        old=baseline_discount,
-                        new=new_discount,
-                    ))
-                    product.baseline_discount = new_discount
-
-        # === Обновляем текущие значения в любом случае ===
-        if new_price is not None:
-            product.current_price = new_price
-        if new_old_price is not None:
-            product.old_price = new_old_price
-        if new_discount is not None:
-            product.discount = new_discount
-        if new_stock is not None:
-            product.stock = new_stock
-        if new_rating is not None:
-            product.rating = new_rating
-
-        product.last_checked_at = now
-
-        # Обновляем title/url если пришли
-        if item.get("name") or item.get("title"):
-            product.title = item.get("name") or item.get("title")
-        if item.get("product_url"):
-            product.url = item.get("product_url")
+        state = {f: getattr(product, f) for f in _STATE_FIELDS}
+        changes, just_stabilized = _update_state(state, item, now)
+        for f, value in state.items():
+            setattr(product, f, value)
 
         # === Сохраняем историю цен ===
-        if new_price is not None:
-            history = PriceHistory(
-                product_id=product.id,
-                price=new_price,
-                old_price=new_old_price,
-                discount=new_discount,
-                stock=new_stock,
-                rating=new_rating,
-                checked_at=now,
-            )
-            session.add(history)
+        history = _history_values(item, now)
+        if history is not None:
+            history_items.append((product.id, history))
 
         results.append(ChangeResult(
             product=product,
@@ -263,4 +409,137 @@ async def detect_and_save_changes(
             changes=changes,
         ))
 
-    return results
\ No newline at end of file
+    await _save_history(session, history_items, now)
+
+    return results
+
+
+async def _save_bulk(
+    session: AsyncSession,
+    platform: Platform,
+    items: list[dict[str, Any]],
+    dialect: str,
+) -> list[ChangeResult]:
+    """
+    Запись пачками: состояние читается колонками (без ORM-объектов),
+    изменения считаются в Python, товары пишутся upsert'ом по
+    uq_products_platform_external, история — одним executemany.
+
+    Окно между чтением и записью закрыто: существующие строки читаются
+    с FOR UPDATE (PostgreSQL; SQLite и так не даст закоммитить чужую запись,
+    пока наша транзакция читает), новые вставляются через ON CONFLICT DO NOTHING —
+    если товар успели создать параллельно, он пересчитывается как существующий.
+    ChangeResult строится по строкам из RETURNING.
+    """
+
+    # Дубли в одной пачке upsert не переживёт (PG) — берём последнее значение
+    by_external: dict[str, dict[str, Any]] = {}
+    for item in items:
+        external_id = str(item.get("external_id") or "")
+        if external_id:
+            by_external[external_id] = item
+
+    if not by_external:
+        return []
+
+    insert_fn = _DIALECT_INSERT[dialect]
+    now = datetime.now(timezone.utc)
+    existing = await _load_states(session, platform.id, list(by_external))
+
+    # === Новые товары ===
+    new_rows = [
+        {"platform_id": platform.id, "external_id": external_id, **_new_state(external_id, item, now)}
+        for external_id, item in by_external.items()
+        if external_id not in existing
+    ]
+    inserted: dict[str, dict[str, Any]] = {}
+    for i in range(0, len(new_rows), BULK_CHUNK_SIZE):
+        stmt = (
+            insert_fn(Product)
+            .values(new_rows[i:i + BULK_CHUNK_SIZE])
+            .on_conflict_do_nothing(index_elements=[Product.platform_id, Product.external_id])
+            .returning(*_RETURNING)
+        )
+        for row in (await session.execute(stmt)).mappings():
+            inserted[row["external_id"]] = dict(row)
+
+    # Не вставились — их создал кто-то другой после нашего чтения
+    raced = [row["external_id"] for row in new_rows if row["external_id"] not in inserted]
+    if raced:
+        existing.update(await _load_states(session, platform.id, raced))
+
+    # === Существующие товары ===
+    update_rows: list[dict[str, Any]] = []
+    detected: dict[str, tuple[list[FieldChange], bool]] = {}  # external_id -> (changes, just_stabilized)
+    history_items: list[tuple[int, dict[str, Any]]] = []
+
+    for external_id, current in existing.items():
+        item = by_external[external_id]
+        state = {f: current[f] for f in _STATE_FIELDS}
+        detected[external_id] = _update_state(state, item, now)
+        update_rows.append({"platform_id": platform.id, "external_id": external_id, **state})
+
+        # История — только для уже известных товаров (как и в ORM-пути)
+        history = _history_values(item, now)
+        if history is not None:
+            history_items.append((current["id"], history))
+
+    updated: dict[str, dict[str, Any]] = {}
+    for i in range(0, len(update_rows), BULK_CHUNK_SIZE):
+        stmt = insert_fn(Product).values(update_rows[i:i + BULK_CHUNK_SIZE])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[Product.platform_id, Product.external_id],
+            set_={f: stmt.excluded[f] for f in _STATE_FIELDS},
+        ).returning(*_RETURNING)
+        for row in (await session.execute(stmt)).mappings():
+            updated[row["external_id"]] = dict(row)
+
+    # История цен
+    await _save_history(session, history_items, now)
+
+    # ChangeResult — по записанным строкам (Product не привязан к сессии, только для чтения полей)
+    results: list[ChangeResult] = []
+    for external_id in by_external:
+        if external_id in inserted:
+            row = inserted[external_id]
+            results.append(ChangeResult(
+                product=Product(**row),
+                is_new=True,
+                is_stable=bool(row["is_stable"]),
+                just_stabilized=False,
+                changes=[],
+            ))
+        elif external_id in updated:
+            row = updated[external_id]
+            changes, just_stabilized = detected[external_id]
+            results.append(ChangeResult(
+                product=Product(**row),
+                is_new=False,
+                is_stable=bool(row["is_stable"]),
+                just_stabilized=just_stabilized,
+                changes=changes,
+            ))
+
+    return results
+
+
+# Что возвращает upsert: ключи + всё состояние товара
+_RETURNING = (Product.id, Product.platform_id, Product.external_id) + tuple(getattr(Product, f) for f in _STATE_FIELDS)
+
+
+async def _load_states(
+    session: AsyncSession,
+    platform_id: int,
+    external_ids: list[str],
+) -> dict[str, dict[str, Any]]:
+    """Текущее состояние товаров колонками; строки блокируются до конца транзакции."""
+    columns = [Product.id, Product.external_id] + [getattr(Product, f) for f in _STATE_FIELDS]
+    states: dict[str, dict[str, Any]] = {}
+    for i in range(0, len(external_ids), BULK_CHUNK_SIZE):
+        stmt = select(*columns).where(
+            Product.platform_id == platform_id,
+            Product.external_id.in_(external_ids[i:i + BULK_CHUNK_SIZE]),
+        ).with_for_update()
+        for row in (await session.execute(stmt)).mappings():
+            states[row["external_id"]] = dict(row)
+    return states
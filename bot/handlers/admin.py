@@ -341,6 +341,22 @@ async def cmd_stats(message: Message):
                 )
             )
             changes_1h = changes_hour_result.scalar() or 0
+            
+            # Проверено товаров (по last_checked_at: история в сжатом
+            # режиме пишется только при изменениях и проверки не отражает)
+            checked_24h_result = await session.execute(
+                select(func.count(Product.id)).where(
+                    Product.last_checked_at >= day_ago
+                )
+            )
+            checked_24h = checked_24h_result.scalar() or 0
+            
+            checked_1h_result = await session.execute(
+                select(func.count(Product.id)).where(
+                    Product.last_checked_at >= hour_ago
+                )
+            )
+            checked_1h = checked_1h_result.scalar() or 0
         
         # Настройки
         all_settings = await settings_manager.get_all_settings()
@@ -353,6 +369,8 @@ async def cmd_stats(message: Message):
 • С ценой: <code>{priced_products}</code>
 
 <b>Активность:</b>
+• Проверено за час: <code>{checked_1h}</code>
+• Проверено за 24ч: <code>{checked_24h}</code>
 • Изменений за час: <code>{changes_1h}</code>
 • Изменений за 24ч: <code>{changes_24h}</code>
 
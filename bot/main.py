@@ -24,10 +24,15 @@ from bot.scheduler.scheduler import SchedulerService
 from bot.services.product_manager import ProductManager
 from bot.services.settings_manager import SettingsManager
 from bot.utils.logger import setup_logger
+from bot.utils.ozon_images import close_ozon_image_resolver
+from bot.utils.wb_basket import close_basket_probe_session
+from bot.utils.wb_http import close_wb_session
+from bot.utils.wb_identities import close_identity_pool, get_identity_pool
 
 
 CLEANUP_TIMESTAMP_FILE = Path(".last_cleanup")
 CLEANUP_INTERVAL_HOURS = int(os.getenv("CLEANUP_INTERVAL_HOURS", "24"))
+REFILL_INTERVAL_MINUTES = int(os.getenv("REFILL_INTERVAL_MINUTES", "60"))
 
 # Retry настройки для polling
 POLLING_RETRY_DELAY = 10  # секунд между попытками
@@ -95,9 +100,46 @@ async def main() -> None:
         settings_manager=settings_manager,
     )
 
-    # Очистка мёртвых товаров (только WB)
+    # Cookies WB (по каждой identity) обновляются в фоне (с диска, если есть свежие)
     if enable_wb:
-        if _needs_cleanup():
+        get_identity_pool().start()
+
+    target_count = int(os.getenv("TARGET_PRODUCT_COUNT", "3000"))
+
+    # Создаём парсеры; список ID перечитывается из БД на каждом запуске
+    wb_parser = WildberriesParser() if enable_wb else None
+    # OZON: подключение к Chrome и вкладки живут между запусками
+    ozon_parser = OzonParser() if enable_ozon else None
+    detmir_parser = DetmirParser() if enable_dm else None
+
+    async def wb_job() -> None:
+        wb_ids = await product_manager.get_product_ids(PlatformCode.WB)
+        log.info("WB products to monitor (fresh from DB): %d", len(wb_ids))
+        wb_parser.set_product_ids(int(x) for x in wb_ids)
+        await pipeline.run_platform(platform=PlatformCode.WB, parser=wb_parser)
+
+    async def ozon_job() -> None:
+        # Давно не проверенные — первыми: при неполном цикле хвост не голодает
+        ozon_ids = await product_manager.get_product_ids(PlatformCode.OZON, least_recently_checked=True)
+        log.info("OZON products to monitor (fresh from DB): %d", len(ozon_ids))
+
+        ozon_parser.set_product_ids(ozon_ids)
+        await pipeline.run_platform(platform=PlatformCode.OZON, parser=ozon_parser)
+        await product_manager.mark_checked(PlatformCode.OZON, ozon_parser.checked_ids)
+
+    # Очистка мёртвых товаров (WB: картинки, OZON: по 404/410 подряд).
+    # .last_cleanup проверяется только при старте (чтобы рестарт не гонял очистку
+    # заново); плановые запуски и так идут раз в CLEANUP_INTERVAL_HOURS.
+    cleanup_at_startup = True
+
+    async def cleanup_job() -> None:
+        nonlocal cleanup_at_startup
+        startup, cleanup_at_startup = cleanup_at_startup, False
+        if startup and not _needs_cleanup():
+            log.info("Skipping cleanup (last run < %d hours ago)", CLEANUP_INTERVAL_HOURS)
+            return
+
+        if enable_wb:
             log.info("Cleaning up dead products (runs every %d hours)...", CLEANUP_INTERVAL_HOURS)
             try:
                 removed, _dead_ids = await product_manager.cleanup_dead_products(PlatformCode.WB)
@@ -106,106 +148,60 @@ async def main() -> None:
                 _mark_cleanup_done()
             except Exception as e:
                 log.error("Cleanup failed: %s", e)
-        else:
-            log.info("Skipping cleanup (last run < %d hours ago)", CLEANUP_INTERVAL_HOURS)
-    else:
-        log.info("WB disabled -> cleanup skipped")
 
-        # Очистка мёртвых товаров (OZON: по 404/410 подряд)
-    if enable_ozon:
-        if _needs_cleanup():
+        if enable_ozon:
             log.info("Cleaning up dead OZON products (404/410 x%d)...", 3)
             try:
-                removed, dead_ids = await product_manager.cleanup_dead_products_ozon(dead_after=3)
+                removed, _dead_ids = await product_manager.cleanup_dead_products_ozon(dead_after=3)
                 if removed > 0:
                     log.info("OZON dead removed %d products", removed)
                 _mark_cleanup_done()
             except Exception as e:
                 log.error("OZON cleanup failed: %s", e)
-        else:
-            log.info("Skipping OZON cleanup (last run < %d hours ago)", CLEANUP_INTERVAL_HOURS)
-    else:
-        log.info("OZON disabled -> cleanup skipped")
-    
-
-    # Проверяем количество товаров (WB)
-    target_count = int(os.getenv("TARGET_PRODUCT_COUNT", "3000"))
-
-    if enable_wb:
-        current_count = await product_manager.get_product_count(PlatformCode.WB)
-        if current_count < target_count:
-            log.info("WB products count %d < %d, refilling...", current_count, target_count)
-            added, total = await product_manager.refill_products(PlatformCode.WB, target_count=target_count)
-            log.info("WB refilled %d products, total: %d", added, total)
-
-    if enable_ozon:
-        ozon_count = await product_manager.get_product_count(PlatformCode.OZON)
-        if ozon_count < target_count:
-            log.warning(
-                "OZON products count %d < %d. Run test_ozon_fill_db_3000.py to refill.",
-                ozon_count,
-                target_count,
-            )
-
-    # Создаём парсеры с ID из БД
-    wb_parser = None
-    ozon_parser = None
-    detmir_parser = None
-
-    if enable_wb:
-        wb_product_ids = await product_manager.get_product_ids(PlatformCode.WB)
-        log.info("WB products to monitor: %d", len(wb_product_ids))
-        wb_parser = WildberriesParser(product_ids=[int(x) for x in wb_product_ids] if wb_product_ids else None)
-
-    if enable_ozon:
-        ozon_product_ids = await product_manager.get_product_ids(PlatformCode.OZON)
-        log.info("OZON products in DB: %d", len(ozon_product_ids))
-        ozon_parser = None  # парсер будем создавать на каждый запуск
-
-    if enable_dm:
-        detmir_parser = DetmirParser()
-
-    # Initial sync (только включённые платформы)
-    if enable_wb and wb_parser:
-        log.info("Running WB pipeline once for initial sync")
-        await pipeline.run_platform(platform=PlatformCode.WB, parser=wb_parser)
-        log.info("WB pipeline initial sync finished")
-
-    if enable_ozon:
-        log.info("Running OZON pipeline once for initial sync (fresh parser)")
-        ozon_ids = await product_manager.get_product_ids(PlatformCode.OZON)
-        log.info("OZON products to monitor (fresh from DB): %d", len(ozon_ids))
-
-        ozon_parser_once = OzonParser(product_ids=ozon_ids if ozon_ids else None)
-        try:
-            await pipeline.run_platform(platform=PlatformCode.OZON, parser=ozon_parser_once)
-        finally:
-            await ozon_parser_once.close()
-
-        log.info("OZON pipeline initial sync finished")
-
-    if enable_dm and detmir_parser:
-        log.info("Running DM pipeline once for initial sync")
-        await pipeline.run_platform(platform=PlatformCode.DM, parser=detmir_parser)
-        log.info("DM pipeline initial sync finished")
-
-    async def ozon_job() -> None:
-        ozon_ids = await product_manager.get_product_ids(PlatformCode.OZON)
-        log.info("OZON products to monitor (fresh from DB): %d", len(ozon_ids))
-
-        parser = OzonParser(product_ids=ozon_ids if ozon_ids else None)
-        try:
-            await pipeline.run_platform(platform=PlatformCode.OZON, parser=parser)
-        finally:
-            await parser.close()
 
+    # Проверяем количество товаров и добираем (WB)
+    async def refill_job() -> None:
+        if enable_wb:
+            current_count = await product_manager.get_product_count(PlatformCode.WB)
+            if current_count < target_count:
+                log.info("WB products count %d < %d, refilling...", current_count, target_count)
+                added, total = await product_manager.refill_products(PlatformCode.WB, target_count=target_count)
+                log.info("WB refilled %d products, total: %d", added, total)
+
+        if enable_ozon:
+            ozon_count = await product_manager.get_product_count(PlatformCode.OZON)
+            if ozon_count < target_count:
+                log.warning(
+                    "OZON products count %d < %d. Run test_ozon_fill_db_3000.py to refill.",
+                    ozon_count,
+                    target_count,
+                )
+
+    # Initial sync делает сам scheduler (run_at_start), main сразу уходит в polling
     scheduler = SchedulerService(
         intervals=settings.parsing,
-        wb_task=(lambda: pipeline.run_platform(platform=PlatformCode.WB, parser=wb_parser)) if (enable_wb and wb_parser) else None,
-        ozon_task=(lambda: ozon_job()) if enable_ozon else None,
+        wb_task=wb_job if (enable_wb and wb_parser) else None,
+        ozon_task=ozon_job if (enable_ozon and ozon_parser) else None,
         detmir_task=(lambda: pipeline.run_platform(platform=PlatformCode.DM, parser=detmir_parser)) if (enable_dm and detmir_parser) else None,
+        run_at_start=True,
     )
 
+    if enable_wb or enable_ozon:
+        scheduler.add_maintenance_job(
+            "cleanup",
+            cleanup_job,
+            seconds=CLEANUP_INTERVAL_HOURS * 3600,
+            run_at_start=True,
+            priority=0,
+        )
+        scheduler.add_maintenance_job(
+            "refill",
+            refill_job,
+            seconds=REFILL_INTERVAL_MINUTES * 60,
+            run_at_start=True,
+            priority=1,
+        )
+
     scheduler.start()
     log.info("Scheduler started")
 
@@ -246,6 +242,12 @@ async def main() -> None:
 
     log.info("Shutting down")
     scheduler.shutdown()
+    if ozon_parser:
+        await ozon_parser.close()
+    await close_ozon_image_resolver()
+    await close_wb_session()
+    await close_basket_probe_session()
+    await close_identity_pool()
     await bot.session.close()
     await engine.dispose()
 
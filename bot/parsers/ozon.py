@@ -1,7 +1,8 @@
 # bot/parsers/ozon.py
 """
 Парсер OZON с двумя режимами:
-- COLLECT: сбор товаров через infinite scroll (для наполнения БД)
+- COLLECT: сбор товаров через постраничный entrypoint API
+  (infinite scroll — запасной вариант) для наполнения БД
 - MONITOR: проверка цен через API (для мониторинга)
 """
 
@@ -14,7 +15,10 @@ import os
 import random
 import re
 from collections import Counter
-from typing import Any, Iterable
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable
+
+from bot.utils.search_cache import get_search_cache
 
 log = logging.getLogger(__name__)
 
@@ -27,12 +31,40 @@ SCROLL_DELAY_SEC = float(os.getenv("OZON_SCROLL_DELAY_SEC", "1.2"))
 MAX_SCROLL_STEPS = int(os.getenv("OZON_MAX_SCROLL_STEPS", "500"))
 QUIET_STEPS_STOP = int(os.getenv("OZON_QUIET_STEPS_STOP", "30"))
 LOG_EVERY_STEPS = int(os.getenv("OZON_LOG_EVERY_STEPS", "25"))
+# Фильтр ресурсов на страницах сбора: картинки/шрифты/медиа/трекеры не грузим,
+# JSON API (tileGrid) и скрипты пропускаем. С фильтром можно скроллить быстрее.
+BLOCK_RESOURCES = os.getenv("OZON_BLOCK_RESOURCES", "true").lower() in ("1", "true", "yes")
+SCROLL_DELAY_FILTERED_SEC = float(os.getenv("OZON_SCROLL_DELAY_FILTERED_SEC", "0.6"))
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font"}
+BLOCKED_URL_PARTS = [
+    "mc.yandex.ru", "an.yandex.ru", "yandex.ru/ads", "google-analytics.com",
+    "googletagmanager.com", "doubleclick.net", "top-fwz1.mail.ru", "vk.com/rtrg",
+] + [p.strip() for p in os.getenv("OZON_BLOCKED_URL_PARTS", "").split(",") if p.strip()]
+
+# COLLECT через entrypoint API: страницы выдачи напрямую, без scroll
+COLLECT_VIA_API = os.getenv("OZON_COLLECT_VIA_API", "true").lower() in ("1", "true", "yes")
+COLLECT_API_CONCURRENCY = int(os.getenv("OZON_COLLECT_API_CONCURRENCY", "3"))
+COLLECT_API_MAX_PAGES = int(os.getenv("OZON_COLLECT_API_MAX_PAGES", "100"))
+COLLECT_API_PAGE_DELAY_SEC = float(os.getenv("OZON_COLLECT_API_PAGE_DELAY_SEC", "0.5"))
+COLLECT_API_TIMEOUT_SEC = float(os.getenv("OZON_COLLECT_API_TIMEOUT_SEC", "30"))
 
 # === Настройки MONITOR режима ===
 MONITOR_BATCH_SIZE = int(os.getenv("OZON_MONITOR_BATCH_SIZE", "100"))
 MONITOR_REQUEST_DELAY = float(os.getenv("OZON_MONITOR_REQUEST_DELAY", "0.3"))
 MONITOR_ERROR_DELAY = float(os.getenv("OZON_MONITOR_ERROR_DELAY", "2.0"))
 MONITOR_MAX_ERRORS = int(os.getenv("OZON_MONITOR_MAX_ERRORS", "10"))
+# Повторы временных ошибок в том же цикле: backoff = MONITOR_ERROR_DELAY * 2^(попытка-1)
+MONITOR_MAX_ATTEMPTS = int(os.getenv("OZON_MONITOR_MAX_ATTEMPTS", "3"))
+MONITOR_RETRY_MAX_DELAY_SEC = float(os.getenv("OZON_MONITOR_RETRY_MAX_DELAY_SEC", "60"))
+# Параллельных fetch внутри страницы на один evaluate
+MONITOR_PAGE_CONCURRENCY = int(os.getenv("OZON_MONITOR_PAGE_CONCURRENCY", "6"))
+MONITOR_FETCH_TIMEOUT_SEC = float(os.getenv("OZON_MONITOR_FETCH_TIMEOUT_SEC", "20"))
+# Таймаут пачки считается из её размера (см. _batch_timeout); это запас сверху
+MONITOR_BATCH_TIMEOUT_MARGIN_SEC = float(os.getenv("OZON_MONITOR_BATCH_TIMEOUT_MARGIN_SEC", "30"))
+# Вкладок для MONITOR в одном Chrome (SKU шардируются между ними)
+MONITOR_TABS = int(os.getenv("OZON_MONITOR_TABS", "3"))
+# Проверка живости соединения перед каждым запуском
+HEALTH_CHECK_TIMEOUT_SEC = float(os.getenv("OZON_HEALTH_CHECK_TIMEOUT_SEC", "10"))
 # === Антибан / recovery ===
 OZON_403_COOLDOWN_SEC = float(os.getenv("OZON_403_COOLDOWN_SEC", "120"))  # пауза при волне 403
 OZON_MAX_RECOVERIES = int(os.getenv("OZON_MAX_RECOVERIES", "3"))         # сколько раз пытаться восстановиться за цикл
@@ -50,6 +82,139 @@ DEFAULT_SEED_URLS = [
 SKIP_CARD_ONLY_ITEMS = os.getenv("OZON_SKIP_CARD_ONLY", "false").lower() in ("1", "true", "yes")
 
 
+# Пачка SKU -> entrypoint-api.bx внутри страницы, N воркеров, пауза между запросами воркера.
+# widgetStates разбираются в браузере, через CDP идёт только компактная запись.
+# Результаты в порядке skus: {data: {price, cardPrice, originalPrice, isAvailable,
+# title, image, score, count}} или {error}.
+_BATCH_FETCH_JS = """
+async ({skus, concurrency, delayMs, timeoutMs}) => {
+    const results = new Array(skus.length);
+    let next = 0;
+    const sleep = (ms) => new Promise(r => setTimeout(r, ms));
+
+    // Из widgetStates разбираем только нужные виджеты и отдаём компактную запись
+    function extract(page) {
+        const rec = {};
+        const states = (page && page.widgetStates) || {};
+        for (const [key, value] of Object.entries(states)) {
+            if (typeof value !== "string") continue;
+            const isPrice = key.includes("webPrice") && !key.includes("Decreased");
+            const isHeading = key.includes("webProductHeading");
+            const isGallery = key.includes("webGallery");
+            const isScore = key.includes("webReviewProductScore");
+            if (!(isPrice || isHeading || isGallery || isScore)) continue;
+
+            let w;
+            try { w = JSON.parse(value); } catch (e) { continue; }
+            if (!w) continue;
+
+            if (isPrice) {
+                rec.price = w.price ?? null;
+                rec.cardPrice = w.cardPrice ?? null;
+                rec.originalPrice = w.originalPrice ?? null;
+                rec.isAvailable = w.isAvailable ?? true;
+            }
+            if (isHeading) rec.title = w.title ?? null;
+            if (isGallery && w.covers && w.covers.length) rec.image = w.covers[0].link ?? null;
+            if (isScore) {
+                rec.score = w.score ?? null;
+                rec.count = w.count ?? null;
+            }
+        }
+        return rec;
+    }
+
+    async function fetchOne(sku) {
+        const url = "/api/entrypoint-api.bx/page/json/v2?url=/product/" + sku + "/";
+        const ctrl = new AbortController();
+        const timer = setTimeout(() => ctrl.abort(), timeoutMs);
+        try {
+            const resp = await fetch(url, {signal: ctrl.signal});
+            if (!resp.ok) return {error: resp.status};
+            return {data: extract(await resp.json())};
+        } catch (e) {
+            return {error: e.name === "AbortError" ? "timeout" : e.message};
+        } finally {
+            clearTimeout(timer);
+        }
+    }
+
+    async function worker() {
+        while (next < skus.length) {
+            const i = next++;
+            results[i] = await fetchOne(skus[i]);
+            if (delayMs > 0) await sleep(delayMs);
+        }
+    }
+
+    await Promise.all(Array.from({length: Math.max(1, Math.min(concurrency, skus.length))}, worker));
+    return results;
+}
+"""
+
+
+# Одна страница каталога/поиска через entrypoint API. Через CDP возвращаем
+# только tileGrid-виджеты и курсор следующей страницы.
+_API_PAGE_JS = """
+async ({path, timeoutMs}) => {
+    const ctrl = new AbortController();
+    const timer = setTimeout(() => ctrl.abort(), timeoutMs);
+    try {
+        const url = "/api/entrypoint-api.bx/page/json/v2?url=" + encodeURIComponent(path);
+        const resp = await fetch(url, {signal: ctrl.signal});
+        if (!resp.ok) return {error: resp.status};
+        const data = await resp.json();
+        const states = {};
+        for (const [key, value] of Object.entries(data.widgetStates || {})) {
+            if (key.toLowerCase().includes("tilegrid")) states[key] = value;
+        }
+        return {widgetStates: states, nextPage: data.nextPage || null};
+    } catch (e) {
+        return {error: e.name === "AbortError" ? "timeout" : e.message};
+    } finally {
+        clearTimeout(timer);
+    }
+}
+"""
+
+
+async def _route_filter(route) -> None:
+    request = route.request
+    try:
+        if request.resource_type in BLOCKED_RESOURCE_TYPES or any(p in request.url for p in BLOCKED_URL_PARTS):
+            await route.abort()
+        else:
+            await route.continue_()
+    except Exception:
+        # страница закрылась / запрос уже обработан
+        pass
+
+
+# Классы ошибок MONITOR
+ERR_BLOCKED = "blocked"      # 403/429 — лимит/бан, повторить позже
+ERR_GONE = "gone"            # 404/410 — товар удалён, не повторяем
+ERR_TRANSIENT = "transient"  # таймаут/5xx/сеть — повторить позже
+ERR_NO_PRICE = "no_price"    # ответ есть, цены нет (нет в наличии) — не повторяем
+RETRY_CLASSES = (ERR_BLOCKED, ERR_TRANSIENT)
+
+
+def _classify_error(error: str) -> str:
+    if error in ("403", "429"):
+        return ERR_BLOCKED
+    if error in ("404", "410"):
+        return ERR_GONE
+    return ERR_TRANSIENT
+
+
+def _batch_timeout(count: int) -> float:
+    """
+    Худшее время evaluate на count SKU: fetch'и идут волнами по
+    MONITOR_PAGE_CONCURRENCY, каждый — до таймаута плюс пауза воркера.
+    """
+    waves = -(-count // max(1, MONITOR_PAGE_CONCURRENCY))
+    return waves * (MONITOR_FETCH_TIMEOUT_SEC + MONITOR_REQUEST_DELAY) + MONITOR_BATCH_TIMEOUT_MARGIN_SEC
+
+
 def _extract_price(text: str) -> int | None:
     """Извлекает число из строки с ценой."""
     if not text:
@@ -66,6 +231,22 @@ def _parse_discount(discount_str: str | None) -> int | None:
     return int(match.group(1)) if match else None
 
 
+OZON_HOME_URL = "https://www.ozon.ru/"
+
+
+@dataclass
+class _OzonTab:
+    """Вкладка MONITOR: своё состояние здоровья и восстановление."""
+
+    name: str
+    page: Any
+    owned: bool = True  # вкладку открыли мы — закрываем при close()
+    errors_in_row: int = 0
+    recoveries: int = 0
+    error_counts: Counter = field(default_factory=Counter)
+    alive: bool = True
+
+
 class OzonParser:
     """
     Парсер OZON.
@@ -73,16 +254,34 @@ class OzonParser:
     Режимы:
     - COLLECT: parse_products_batch([]) — сбор через scroll (SKU)
     - MONITOR: parse_products_batch(["sku1", "sku2", ...]) — проверка через API
+
+    Экземпляр долгоживущий: подключение и прогретые вкладки переживают
+    запуски scheduler, переподключение — только если проверка здоровья
+    не прошла. Список SKU обновляется через set_product_ids().
     """
 
     def __init__(self, product_ids: Iterable[int | str] | None = None) -> None:
-        self._product_ids = [str(x) for x in product_ids] if product_ids else []
+        self.set_product_ids(product_ids)
 
         self._playwright = None
         self._browser = None
         self._context = None
         self._page = None
+        self._tabs: list[_OzonTab] = []
         self._connected = False
+        # SKU, не проверенные в прошлом цикле (лимиты/ошибки) — идут первыми в следующем
+        self._carry_over: list[str] = []
+        # SKU, получившие ответ в последнем цикле MONITOR (для last_checked_at)
+        self._checked_ids: list[str] = []
+
+    def set_product_ids(self, product_ids: Iterable[int | str] | None) -> None:
+        """Обновляет список SKU (подключение и вкладки сохраняются)."""
+        self._product_ids = [str(x) for x in product_ids] if product_ids else []
+
+    @property
+    def checked_ids(self) -> list[str]:
+        """SKU, по которым в последнем цикле MONITOR был окончательный ответ."""
+        return self._checked_ids
 
     # =========================================================================
     # Подключение к Chrome
@@ -105,20 +304,96 @@ class OzonParser:
         self._browser = await self._playwright.chromium.connect_over_cdp(CDP_URL)
 
         self._context = self._browser.contexts[0] if self._browser.contexts else await self._browser.new_context()
+        owned = not self._context.pages
         self._page = self._context.pages[0] if self._context.pages else await self._context.new_page()
 
         # Инициализируем сессию
-        await self._page.goto("https://www.ozon.ru/", wait_until="domcontentloaded", timeout=30000)
+        await self._page.goto(OZON_HOME_URL, wait_until="domcontentloaded", timeout=30000)
         await asyncio.sleep(2)
 
+        # Основная вкладка — первая вкладка MONITOR, остальные открываем параллельно
+        self._tabs = [_OzonTab("tab-0", self._page, owned=owned)]
+        extra = await asyncio.gather(
+            *(self._open_tab() for _ in range(MONITOR_TABS - 1)),
+            return_exceptions=True,
+        )
+        for page in extra:
+            if isinstance(page, Exception):
+                log.warning("OZON: failed to open monitor tab: %s", page)
+                continue
+            self._tabs.append(_OzonTab(f"tab-{len(self._tabs)}", page))
+
         self._connected = True
-        log.info("OZON: connected to Chrome")
+        log.info("OZON: connected to Chrome (%d monitor tabs)", len(self._tabs))
+
+    async def _open_tab(self) -> Any:
+        page = await self._context.new_page()
+        try:
+            await page.goto(OZON_HOME_URL, wait_until="domcontentloaded", timeout=30000)
+        except Exception:
+            await page.close()
+            raise
+        return page
+
+    async def _recover_tab(self, tab: _OzonTab) -> bool:
+        """Перезагружает вкладку, при неудаче — заменяет её новой."""
+        try:
+            if tab.page.is_closed():
+                raise RuntimeError("page is closed")
+            await tab.page.goto(OZON_HOME_URL, wait_until="domcontentloaded", timeout=30000)
+        except Exception as e:
+            log.warning("OZON %s: reload failed (%s), opening new tab", tab.name, e)
+            try:
+                page = await self._open_tab()
+            except Exception as e:
+                log.error("OZON %s: failed to open new tab: %s", tab.name, e)
+                return False
+
+            if tab.owned:
+                try:
+                    await tab.page.close()
+                except Exception:
+                    pass
+            if tab.page is self._page:
+                self._page = page
+            tab.page = page
+            tab.owned = True
+
+        await asyncio.sleep(2)
+        tab.errors_in_row = 0
+        tab.error_counts.clear()
+        return True
 
     async def _ensure_connected(self) -> None:
+        if self._connected and not await self._is_healthy():
+            log.warning("OZON: connection is unhealthy, reconnecting")
+            await self.close()
+
         if not self._connected:
             await self._connect()
 
+    async def _is_healthy(self) -> bool:
+        """Дешёвая проверка: CDP-соединение живо и основная вкладка отвечает."""
+        try:
+            if not self._browser or not self._browser.is_connected():
+                return False
+            if not self._page or self._page.is_closed():
+                return False
+            await asyncio.wait_for(self._page.evaluate("1"), timeout=HEALTH_CHECK_TIMEOUT_SEC)
+            return True
+        except Exception:
+            return False
+
     async def close(self) -> None:
+        # Вкладки, открытые нами, закрываем — иначе они останутся в общем Chrome
+        for tab in self._tabs:
+            if tab.owned:
+                try:
+                    await tab.page.close()
+                except Exception:
+                    pass
+        self._tabs = []
+
         try:
             if self._playwright:
                 await self._playwright.stop()
@@ -142,23 +417,68 @@ class OzonParser:
     async def parse_product(self, raw: Any) -> dict[str, Any]:
         await self._ensure_connected()
         sku = str(raw)
-        products = await self._monitor_products([sku])
+        # Разовая проверка: состояние цикла (carry-over, checked_ids) не трогаем
+        products = await self._monitor_products([sku], track_cycle=False)
         return products[0] if products else self._empty_product(sku)
 
     async def parse_products_batch(self, product_ids: list[int | str]) -> list[dict[str, Any]]:
         await self._ensure_connected()
 
         if not product_ids:
-            log.info("OZON: COLLECT mode (scroll)")
-            return await self._collect_from_scroll()
+            log.info("OZON: COLLECT mode (%s)", "api" if COLLECT_VIA_API else "scroll")
+            return await self._collect()
 
         log.info("OZON: MONITOR mode (%d products)", len(product_ids))
         return await self._monitor_products(product_ids)
 
+    async def parse_products_stream(self, product_ids: list[int | str]) -> AsyncIterator[list[dict[str, Any]]]:
+        """MONITOR, но результаты отдаются по мере готовности — пачкой на каждую проверенную пачку SKU."""
+        await self._ensure_connected()
+        log.info("OZON: MONITOR mode, streaming (%d products)", len(product_ids))
+
+        # Маленькая очередь: если потребитель не успевает, вкладки ждут его
+        ready: asyncio.Queue[list[dict[str, Any]]] = asyncio.Queue(maxsize=2)
+        monitor = asyncio.create_task(self._monitor_products(product_ids, on_results=ready.put))
+        try:
+            while True:
+                getter = asyncio.create_task(ready.get())
+                await asyncio.wait([getter, monitor], return_when=asyncio.FIRST_COMPLETED)
+                if getter.done():
+                    yield getter.result()
+                    continue
+
+                getter.cancel()
+                # Монитор закончил — дочитываем то, что успел положить
+                while not ready.empty():
+                    yield ready.get_nowait()
+                monitor.result()  # пробрасываем исключение монитора
+                return
+        finally:
+            if not monitor.done():
+                monitor.cancel()
+                await asyncio.gather(monitor, return_exceptions=True)
+
     # =========================================================================
     # COLLECT режим: сбор через scroll
     # =========================================================================
 
+    async def _enable_resource_filter(self, page: Any) -> bool:
+        """Включает фильтр ресурсов на вкладке сбора. True — фильтр стоит."""
+        if not BLOCK_RESOURCES:
+            return False
+        try:
+            await page.route("**/*", _route_filter)
+            return True
+        except Exception as e:
+            log.warning("OZON: failed to enable resource filter: %s", e)
+            return False
+
+    async def _disable_resource_filter(self, page: Any) -> None:
+        try:
+            await page.unroute("**/*", _route_filter)
+        except Exception:
+            pass
+
     def _extract_sku_from_href(self, href: str) -> str | None:
         if not href:
             return None
@@ -170,7 +490,142 @@ class OzonParser:
         q = quote_plus(query.strip())
         return f"https://www.ozon.ru/search/?text={q}"
 
-    async def _collect_from_scroll(self, seed_urls: list[str] | None = None, target: int | None = None) -> list[dict[str, Any]]:
+    async def _collect(
+        self,
+        seed_urls: list[str] | None = None,
+        target: int | None = None,
+        page: Any = None,
+    ) -> list[dict[str, Any]]:
+        """COLLECT: сначала через API, scroll — для seed'ов, где API не сработал."""
+        target = int(target or COLLECT_TARGET_COUNT)
+        seed_urls = seed_urls or DEFAULT_SEED_URLS
+
+        if not COLLECT_VIA_API:
+            return await self._collect_from_scroll(seed_urls=seed_urls, target=target, page=page)
+
+        items, failed = await self._collect_from_api(seed_urls, target, page=page)
+        if len(items) >= target or not failed:
+            return items
+
+        log.warning("OZON COLLECT(api): %d seeds failed, falling back to scroll", len(failed))
+        collected = {it["external_id"]: it for it in items}
+        for item in await self._collect_from_scroll(seed_urls=failed, target=target - len(collected), page=page):
+            collected.setdefault(item["external_id"], item)
+        return list(collected.values())
+
+    async def _collect_from_api(
+        self,
+        seed_urls: list[str],
+        target: int,
+        page: Any = None,
+    ) -> tuple[list[dict[str, Any]], list[str]]:
+        """
+        Сбор через entrypoint-api.bx: страница за страницей по курсору nextPage,
+        несколько seed'ов параллельно (fetch'и идут из переданной вкладки).
+
+        Возвращает (товары, seed'ы, на которых API не отдал ни одной страницы).
+        """
+        page = page or self._page
+        collected: dict[str, dict[str, Any]] = {}
+        failed: list[str] = []
+        semaphore = asyncio.Semaphore(max(1, COLLECT_API_CONCURRENCY))
+
+        async def crawl(seed_url: str) -> None:
+            async with semaphore:
+                if len(collected) >= target:
+                    return
+
+                got_pages = False
+                try:
+                    async for page_no, items, _next_path in self._iter_api_pages(seed_url, page):
+                        if page_no == 1 and not items:
+                            # формат выдачи не распознан — пусть попробует scroll
+                            break
+                        got_pages = True
+
+                        before = len(collected)
+                        for item in items:
+                            collected.setdefault(item["external_id"], item)
+                        log.info(
+                            "OZON COLLECT(api): %s page=%d +%d (total=%d/%d)",
+                            seed_url, page_no, len(collected) - before, len(collected), target,
+                        )
+
+                        if len(collected) >= target:
+                            break
+                except RuntimeError as e:
+                    log.warning("OZON COLLECT(api): %s", e)
+
+                if not got_pages:
+                    failed.append(seed_url)
+
+        await asyncio.gather(*(crawl(url) for url in seed_urls))
+
+        result = list(collected.values())
+        log.info("OZON COLLECT(api) done: %d items, failed seeds: %d", len(result), len(failed))
+        return result, failed
+
+    async def _iter_api_pages(
+        self,
+        seed_url: str,
+        page: Any,
+        start_page: int = 1,
+        start_path: str | None = None,
+    ) -> AsyncIterator[tuple[int, list[dict[str, Any]], str | None]]:
+        """
+        Страницы выдачи через entrypoint API: (номер, новые товары, путь следующей).
+
+        Можно продолжить с start_page/start_path (сохранённый nextPage).
+        Пустой список товаров — выдача кончилась (OZON повторяет последнюю
+        страницу), после него итерация заканчивается.
+        Ошибка запроса — RuntimeError.
+        """
+        from urllib.parse import urlsplit
+
+        parts = urlsplit(seed_url)
+        base = parts.path + (f"?{parts.query}" if parts.query else "")
+
+        def _with_page(page_no: int) -> str:
+            return base if page_no <= 1 else f"{base}{'&' if '?' in base else '?'}page={page_no}"
+
+        path = start_path or _with_page(start_page)
+        seen: set[str] = set()
+
+        for page_no in range(start_page, COLLECT_API_MAX_PAGES + 1):
+            try:
+                resp = await asyncio.wait_for(
+                    page.evaluate(
+                        _API_PAGE_JS,
+                        {"path": path, "timeoutMs": int(COLLECT_API_TIMEOUT_SEC * 1000)},
+                    ),
+                    timeout=COLLECT_API_TIMEOUT_SEC + 5,
+                )
+            except Exception as e:
+                resp = {"error": str(e)}
+
+            if not isinstance(resp, dict) or "error" in resp:
+                error = resp.get("error") if isinstance(resp, dict) else "empty"
+                raise RuntimeError(f"{base} page={page_no} error={error}")
+
+            items = [it for it in self._parse_tile_grid(resp) if it["external_id"] not in seen]
+            seen.update(it["external_id"] for it in items)
+
+            next_page = resp.get("nextPage")
+            next_path = next_page if isinstance(next_page, str) and next_page else _with_page(page_no + 1)
+
+            yield page_no, items, next_path
+            if not items:
+                return
+
+            path = next_path
+            await asyncio.sleep(COLLECT_API_PAGE_DELAY_SEC)
+
+    async def _collect_from_scroll(
+        self,
+        seed_urls: list[str] | None = None,
+        target: int | None = None,
+        page: Any = None,
+    ) -> list[dict[str, Any]]:
         """Собирает товары через infinite scroll.
 
         Сбор SKU делаем:
@@ -178,6 +633,7 @@ class OzonParser:
         - надёжный fallback из DOM: ссылки /product/<sku>
         """
 
+        page = page or self._page
         collected: dict[str, dict[str, Any]] = {}
         quiet_steps = 0
         target = int(target or COLLECT_TARGET_COUNT)
@@ -219,7 +675,9 @@ class OzonParser:
                 return
 
         log.info("OZON: attach response listener")
-        self._page.on("response", on_response)
+        page.on("response", on_response)
+        filtered = await self._enable_resource_filter(page)
+        scroll_delay = SCROLL_DELAY_FILTERED_SEC if filtered else SCROLL_DELAY_SEC
 
         try:
             for seed_url in seed_urls:
@@ -230,7 +688,7 @@ class OzonParser:
                 log.info("OZON: opening %s", seed_url)
 
                 try:
-                    await self._page.goto(seed_url, wait_until="domcontentloaded", timeout=45000)
+                    await page.goto(seed_url, wait_until="domcontentloaded", timeout=45000)
                 except Exception as e:
                     log.warning("OZON: failed to open %s: %s", seed_url, e)
                     continue
@@ -239,10 +697,10 @@ class OzonParser:
 
                 # Диагностика страницы
                 try:
-                    log.info("OZON page url: %s", self._page.url)
-                    title = await self._page.title()
+                    log.info("OZON page url: %s", page.url)
+                    title = await page.title()
                     log.info("OZON page title: %s", title)
-                    html = (await self._page.content()).lower()
+                    html = (await page.content()).lower()
                     if "captcha" in html or "капча" in html:
                         log.warning("OZON: looks like CAPTCHA page")
                     if "consent" in html and "cookie" in html:
@@ -254,13 +712,13 @@ class OzonParser:
                     if len(collected) >= target:
                         break
 
-                    await self._page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
-                    await asyncio.sleep(SCROLL_DELAY_SEC)
+                    await page.evaluate("window.scrollTo(0, document.body.scrollHeight)")
+                    await asyncio.sleep(scroll_delay)
 
                     # DOM fallback: каждые 5 шагов вынимаем sku из ссылок
                     if step % 5 == 0:
                         try:
-                            hrefs: list[str] = await self._page.eval_on_selector_all(
+                            hrefs: list[str] = await page.eval_on_selector_all(
                                 "a[href*='/product/']",
                                 "els => els.map(e => e.getAttribute('href')).filter(Boolean)",
                             )
@@ -312,19 +770,34 @@ class OzonParser:
         finally:
             log.info("OZON: detach response listener")
             try:
-                self._page.remove_listener("response", on_response)
+                page.remove_listener("response", on_response)
             except Exception:
                 pass
+            # Вкладка дальше работает в MONITOR — снимаем фильтр
+            if filtered:
+                await self._disable_resource_filter(page)
 
         result = list(collected.values())
         log.info("OZON COLLECT done: %d items", len(result))
         return result
 
-    async def collect_skus_by_queries(self, queries: list[str], target: int) -> list[str]:
+    async def collect_skus_by_queries(
+        self,
+        queries: list[str],
+        target: int,
+        exclude: Iterable[str] | None = None,
+    ) -> list[str]:
         """
         Равномерно собирает SKU по списку запросов (категорий/тем).
 
         target — сколько всего SKU нужно собрать (например 10 или 3000).
+        exclude — SKU, которые не нужны (уже в БД), в квоту не идут.
+        Уже просмотренная выдача берётся из кэша, API-обход продолжается
+        со следующей непросмотренной страницы (cursor/nextPage). Scroll
+        продолжать не умеет — он идёт сверху, глубже размера кэша.
+        Запросы, которым не хватило кэша, обходятся параллельно — каждый
+        на своей вкладке; как только target набран, оставшиеся обходы
+        отменяются.
         Возвращает список sku строк (digits).
         """
         queries = [q.strip() for q in (queries or []) if str(q).strip()]
@@ -337,30 +810,107 @@ class OzonParser:
         extra = target % n
 
         collected_skus: list[str] = []
-        seen: set[str] = set()
+        seen: set[str] = {str(x) for x in (exclude or ())}
+        cache = get_search_cache()
 
+        def _take(skus: Iterable[str], quota: int) -> int:
+            taken = 0
+            for sku in skus:
+                if taken >= quota or len(collected_skus) >= target:
+                    break
+                if not sku.isdigit() or sku in seen:
+                    continue
+                seen.add(sku)
+                collected_skus.append(sku)
+                taken += 1
+            return taken
+
+        # 1) Квоты из кэша — без браузера
+        pending: list[tuple[str, str, int]] = []  # (query, cache key, недостающая квота)
         for i, q in enumerate(queries):
             quota = base + (1 if i < extra else 0)
             if quota <= 0:
                 continue
 
-            url = self._build_search_url(q)
-            log.info("OZON REFILL: query='%s' quota=%d url=%s", q, quota, url)
+            key = cache.key("ozon", q)
+            entry = cache.entry(key)
+            taken = _take(entry.ids, quota)
 
-            # собираем немного больше (quota*2), чтобы компенсировать дубли
-            items = await self._collect_from_scroll(seed_urls=[url], target=quota * 2)
+            if taken < quota and not entry.exhausted:
+                pending.append((q, key, quota - taken))
+            else:
+                log.info("OZON REFILL: query='%s' quota=%d served from cache (%d)", q, quota, taken)
+
+        if not pending or len(collected_skus) >= target:
+            return collected_skus
+
+        # 2) Остальное — параллельно, по вкладке на запрос
+        pages: asyncio.Queue = asyncio.Queue()
+        for page in [t.page for t in self._tabs if t.alive] or [self._page]:
+            pages.put_nowait(page)
+        enough = asyncio.Event()
+
+        async def crawl(q: str, key: str, left: int) -> None:
+            page = await pages.get()
+            try:
+                if enough.is_set():
+                    return
+
+                entry = cache.entry(key)
+                url = self._build_search_url(q)
+                log.info(
+                    "OZON REFILL: query='%s' need=%d cached=%d resume page=%d url=%s",
+                    q, left, len(entry.ids), entry.cursor, url,
+                )
+
+                got_pages = False
+                if COLLECT_VIA_API:
+                    try:
+                        async for page_no, items, next_path in self._iter_api_pages(
+                            url, page, start_page=entry.cursor, start_path=entry.next_path,
+                        ):
+                            if page_no == 1 and not items:
+                                # формат выдачи не распознан — scroll
+                                break
+                            got_pages = True
+
+                            skus = [sku for sku in (str(it.get("external_id") or "").strip() for it in items) if sku.isdigit()]
+                            # Пустая страница — выдача действительно кончилась
+                            cache.extend(key, skus, cursor=page_no + 1, exhausted=not items, next_path=next_path)
+
+                            left -= _take(skus, left)
+                            if left <= 0 or len(collected_skus) >= target:
+                                break
+                    except RuntimeError as e:
+                        # 403/таймаут: cursor стоит на последней удачной странице, продолжим в следующий раз
+                        log.warning("OZON REFILL(api): query='%s' %s", q, e)
+
+                if not got_pages and (not COLLECT_VIA_API or entry.cursor <= 1):
+                    # scroll: сверху, глубже уже просмотренного + запас (x2) на дубли
+                    depth = len(entry.ids) + left * 2
+                    items = await self._collect_from_scroll(seed_urls=[url], target=depth, page=page)
+                    skus = [sku for sku in (str(it.get("external_id") or "").strip() for it in items) if sku.isdigit()]
+                    # Короткий скролл (тишина, капча, таймаут) — не признак конца выдачи
+                    cache.extend(key, skus, cursor=entry.cursor)
+                    _take(skus, left)
 
-            # из items берём external_id
-            for it in items:
-                sku = str(it.get("external_id") or "").strip()
-                if not sku.isdigit():
-                    continue
-                if sku in seen:
-                    continue
-                seen.add(sku)
-                collected_skus.append(sku)
                 if len(collected_skus) >= target:
-                    return collected_skus
+                    enough.set()
+            except Exception as e:
+                log.warning("OZON REFILL: query='%s' failed: %s", q, e)
+            finally:
+                pages.put_nowait(page)
+
+        tasks = [asyncio.create_task(crawl(*p)) for p in pending]
+        waiter = asyncio.create_task(enough.wait())
+        try:
+            await asyncio.wait([waiter, asyncio.gather(*tasks, return_exceptions=True)], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await cache.flush()
 
         return collected_skus
 
@@ -482,147 +1032,248 @@ class OzonParser:
     # MONITOR режим: проверка через API
     # =========================================================================
 
-    async def _monitor_products(self, product_ids: list[int | str]) -> list[dict[str, Any]]:
+    async def _monitor_products(
+        self,
+        product_ids: list[int | str],
+        on_results: Callable[[list[dict[str, Any]]], Awaitable[Any]] | None = None,
+        track_cycle: bool = True,
+    ) -> list[dict[str, Any]]:
+        """
+        Пачки SKU раздаются вкладкам через общую очередь: каждая вкладка
+        берёт следующую пачку, как только освободилась.
+
+        Ошибки классифицируются: 403/429 и временные (таймаут/5xx) уходят
+        в очередь повторно с экспоненциальным backoff (до MONITOR_MAX_ATTEMPTS),
+        404/410 и «нет цены» не повторяются. Что не удалось проверить за цикл,
+        переносится в начало следующего. Пауза при волне 403 и восстановление —
+        у каждой вкладки свои.
+
+        on_results(товары) вызывается после каждой пачки с её товарами с ценой.
+        track_cycle=False — разовая проверка: carry-over и checked_ids цикла
+        не читаются и не перезаписываются.
+        """
         results: list[dict[str, Any]] = []
         error_counts = Counter()
-        no_price_count = 0
-        errors_count = 0
-        recoveries = 0
-        total = len(product_ids)
-
-        for idx, sku in enumerate(product_ids, 1):
-            sku = str(sku)
+        class_counts = Counter()
+        skus = [str(x) for x in product_ids]
+        total = len(skus)
+        batch_size = max(1, MONITOR_BATCH_SIZE)
+        checked_ids: list[str] = []
+        carry_over: list[str] = []
+
+        if track_cycle:
+            self._checked_ids = []
+
+        # Недопроверенные в прошлый раз — вперёд
+        wanted = set(skus)
+        first = [sku for sku in self._carry_over if sku in wanted] if track_cycle else []
+        if first:
+            log.info("OZON: %d SKUs carried over from previous cycle", len(first))
+            first_set = set(first)
+            skus = first + [sku for sku in skus if sku not in first_set]
+
+        # (готово_к, seq, попытка, пачка): повторы ждут своего времени в той же очереди
+        queue: asyncio.PriorityQueue = asyncio.PriorityQueue()
+        seq = 0
+        for start in range(0, total, batch_size):
+            queue.put_nowait((0.0, seq, 1, skus[start:start + batch_size]))
+            seq += 1
+
+        loop = asyncio.get_running_loop()
+
+        def requeue(batch: list[str], attempt: int) -> None:
+            nonlocal seq
+            if attempt > MONITOR_MAX_ATTEMPTS:
+                carry_over.extend(batch)
+                return
+            delay = min(MONITOR_RETRY_MAX_DELAY_SEC, MONITOR_ERROR_DELAY * 2 ** (attempt - 2))
+            queue.put_nowait((loop.time() + delay, seq, attempt, batch))
+            seq += 1
 
+        async def worker(tab: _OzonTab) -> None:
+            while tab.alive:
+                ready_at, _seq, attempt, batch = await queue.get()
+                try:
+                    wait = ready_at - loop.time()
+                    if wait > 0:
+                        await asyncio.sleep(wait)
+                    await process(tab, batch, attempt)
+                finally:
+                    queue.task_done()
+
+        async def process(tab: _OzonTab, batch: list[str], attempt: int) -> None:
             try:
-                product = await self._fetch_product_api(sku)
+                products = await self._fetch_products_batch(batch, page=tab.page)
+            except Exception as e:
+                log.warning("OZON %s: exception fetching batch of %d: %s", tab.name, len(batch), e)
+                products = [self._empty_product(sku, error="exception") for sku in batch]
+
+            retry: list[str] = []
+            priced: list[dict[str, Any]] = []
+            for product in products:
+                sku = product["external_id"]
 
                 if product.get("price"):
                     results.append(product)
-                    errors_count = 0
-                else:
-                    if product.get("error"):
-                        err = str(product.get("error"))
-                        error_counts[err] += 1
-                        errors_count += 1
-                        log.warning(
-                            "OZON: api error for %s: %s (errors подряд=%d)",
-                            sku, err, errors_count
-                        )
-                        await asyncio.sleep(MONITOR_ERROR_DELAY)
-                    else:
-                        no_price_count += 1
-                        errors_count += 1
-                        log.debug("OZON: no price for %s", sku)
+                    priced.append(product)
+                    tab.errors_in_row = 0
+                    checked_ids.append(sku)
+                    continue
 
-            except Exception as e:
-                log.warning("OZON: exception fetching %s: %s", sku, e)
-                errors_count += 1
-                await asyncio.sleep(MONITOR_ERROR_DELAY)
-
-            # Если много ошибок подряд — пробуем восстановиться
-            if errors_count >= MONITOR_MAX_ERRORS:
-                recoveries += 1
-                log.error("OZON: too many errors подряд (%d). Recovery #%d", errors_count, recoveries)
-
-                # Если за цикл были 403 — считаем это волной бана/лимита, делаем паузу
-                if error_counts.get("403", 0) > 0:
-                    log.warning("OZON: 403 wave detected -> cooldown %.0f sec", OZON_403_COOLDOWN_SEC)
+                if product.get("error"):
+                    err = str(product.get("error"))
+                    err_class = _classify_error(err)
+                    error_counts[err] += 1
+                    tab.error_counts[err] += 1
+                    log.debug("OZON %s: api error for %s: %s (%s)", tab.name, sku, err, err_class)
+                else:
+                    err_class = ERR_NO_PRICE
+                    log.debug("OZON %s: no price for %s", tab.name, sku)
+
+                class_counts[err_class] += 1
+                # В серию ошибок идут и временные, и блокировки (403/429):
+                # на волну 403 вкладка должна уйти в cooldown и восстановление
+                if err_class in RETRY_CLASSES:
+                    tab.errors_in_row += 1
+                    retry.append(sku)
+                else:
+                    checked_ids.append(sku)
+
+            if retry:
+                log.warning(
+                    "OZON %s: %d/%d need retry (attempt %d, errors подряд=%d): %s",
+                    tab.name, len(retry), len(batch), attempt, tab.errors_in_row,
+                    ", ".join(f"{k}={v}" for k, v in tab.error_counts.most_common(3)),
+                )
+                requeue(retry, attempt + 1)
+
+            log.info("OZON monitor: checked %d/%d, success=%d", len(checked_ids), total, len(results))
+
+            if priced and on_results is not None:
+                await on_results(priced)
+
+            # Если много ошибок подряд — восстанавливаем только эту вкладку
+            if tab.errors_in_row >= MONITOR_MAX_ERRORS:
+                tab.recoveries += 1
+                log.error(
+                    "OZON %s: too many errors подряд (%d). Recovery #%d",
+                    tab.name, tab.errors_in_row, tab.recoveries,
+                )
+
+                # Если на вкладке были 403 — считаем это волной бана/лимита, делаем паузу
+                if tab.error_counts.get("403", 0) > 0:
+                    log.warning("OZON %s: 403 wave detected -> cooldown %.0f sec", tab.name, OZON_403_COOLDOWN_SEC)
                     await asyncio.sleep(OZON_403_COOLDOWN_SEC)
 
-                # Переподключаемся к Chrome/Playwright
-                try:
-                    await self.close()
-                    await asyncio.sleep(2)
-                    await self._ensure_connected()
-                    errors_count = 0
-                    log.info("OZON: recovery reconnect done, continuing monitor")
-                except Exception as e:
-                    log.error("OZON: recovery reconnect failed: %s", e)
-
-                # Если восстановление не помогло несколько раз — завершаем цикл и ждём следующий запуск scheduler
-                if recoveries >= OZON_MAX_RECOVERIES:
-                    log.error(
-                        "OZON: reached max recoveries (%d). Finishing monitor early.",
-                        OZON_MAX_RECOVERIES
-                    )
-                    break
+                if tab.recoveries >= OZON_MAX_RECOVERIES or not await self._recover_tab(tab):
+                    # Вкладка выбывает до следующего запуска, остальные доделывают очередь
+                    log.error("OZON %s: giving up after %d recoveries", tab.name, tab.recoveries)
+                    tab.alive = False
+                else:
+                    log.info("OZON %s: recovery done, continuing monitor", tab.name)
 
-            if idx % 100 == 0:
-                log.info("OZON monitor: %d/%d, success=%d", idx, total, len(results))
+        tabs = list(self._tabs)
+        for tab in tabs:
+            tab.alive = True
+            tab.errors_in_row = 0
+            tab.recoveries = 0
+            tab.error_counts.clear()
 
-            await asyncio.sleep(MONITOR_REQUEST_DELAY)
+        workers = [asyncio.create_task(worker(tab)) for tab in tabs]
+        joiner = asyncio.create_task(queue.join())
+        try:
+            # Очередь разобрана — или все вкладки выбыли
+            await asyncio.wait([joiner, asyncio.gather(*workers, return_exceptions=True)], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            joiner.cancel()
+            for w in workers:
+                w.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+
+        while not queue.empty():
+            carry_over.extend(queue.get_nowait()[3])
+        if not any(t.alive for t in self._tabs):
+            log.error("OZON: all monitor tabs failed, finishing monitor early (%d/%d checked)", len(checked_ids), total)
+            # Следующий запуск переподключится с нуля
+            await self.close()
+
+        if track_cycle:
+            self._carry_over = carry_over
+            self._checked_ids = checked_ids
+            if carry_over:
+                log.warning("OZON: %d SKUs left unchecked, carried over to next cycle", len(carry_over))
 
         log.info("OZON MONITOR done: %d/%d products", len(results), total)
-        if error_counts or no_price_count:
+        if error_counts or class_counts:
             top = ", ".join(f"{k}={v}" for k, v in error_counts.most_common(10))
+            classes = ", ".join(f"{k}={v}" for k, v in class_counts.most_common())
             log.info(
-                "OZON MONITOR stats: success=%d/%d, no_price=%d, errors=[%s]",
-                len(results), total, no_price_count, top
+                "OZON MONITOR stats: success=%d/%d, classes=[%s], errors=[%s]",
+                len(results), total, classes, top
             )
         return results
 
-    async def _fetch_product_api(self, sku: str) -> dict[str, Any]:
-        slug = f"/product/{sku}/"
-        api_url = f"https://www.ozon.ru/api/entrypoint-api.bx/page/json/v2?url={slug}"
-
-        response = await self._page.evaluate(f"""
-            async () => {{
-                try {{
-                    const resp = await fetch("{api_url}");
-                    if (!resp.ok) return {{error: resp.status}};
-                    return await resp.json();
-                }} catch (e) {{
-                    return {{error: e.message}};
-                }}
-            }}
-        """)
-
-        if isinstance(response, dict) and "error" in response:
-            # логируем статус/ошибку
-            log.debug("OZON API error for %s: %s", sku, response["error"])
-            return self._empty_product(sku, error=str(response["error"]))
-
-        #if isinstance(response, dict) and "error" in response:
-        #    return self._empty_product(sku, error=str(response["error"]))
-
-        return self._parse_product_api(response, sku)
-
-    def _parse_product_api(self, data: dict, sku: str) -> dict[str, Any]:
+    async def _fetch_products_batch(self, skus: list[str], page: Any = None) -> list[dict[str, Any]]:
+        """
+        Пачка SKU за один page.evaluate: fetch'и идут внутри страницы
+        с ограниченной параллельностью, результат возвращается целиком.
+        """
+        page = page or self._page
+        response = await asyncio.wait_for(
+            page.evaluate(
+                _BATCH_FETCH_JS,
+                {
+                    "skus": skus,
+                    "concurrency": MONITOR_PAGE_CONCURRENCY,
+                    "delayMs": int(MONITOR_REQUEST_DELAY * 1000),
+                    "timeoutMs": int(MONITOR_FETCH_TIMEOUT_SEC * 1000),
+                },
+            ),
+            # Меньше худшего случая нельзя: пачка засчиталась бы неудачной и
+            # повторилась на той же вкладке, пока её fetch'и ещё идут
+            timeout=_batch_timeout(len(skus)),
+        )
+
+        products: list[dict[str, Any]] = []
+        for sku, item in zip(skus, response or []):
+            if not isinstance(item, dict) or "error" in item:
+                error = item.get("error") if isinstance(item, dict) else "empty"
+                # логируем статус/ошибку
+                log.debug("OZON API error for %s: %s", sku, error)
+                products.append(self._empty_product(sku, error=str(error)))
+            else:
+                products.append(self._parse_product_record(item.get("data") or {}, sku))
+
+        # evaluate вернул меньше, чем просили (не должно случаться)
+        for sku in skus[len(products):]:
+            products.append(self._empty_product(sku, error="missing"))
+
+        return products
+
+    def _parse_product_record(self, record: dict, sku: str) -> dict[str, Any]:
+        """Компактная запись из _BATCH_FETCH_JS -> товар."""
         result = self._empty_product(sku)
-        widget_states = data.get("widgetStates") or {}
-
-        for key, value in widget_states.items():
-            if not isinstance(value, str):
-                continue
-
-            try:
-                parsed = json.loads(value)
-            except Exception:
-                continue
 
-            if "webPrice" in key and "Decreased" not in key:
-                result["price"] = _extract_price(parsed.get("price"))
-                result["card_price"] = _extract_price(parsed.get("cardPrice"))
-                result["old_price"] = _extract_price(parsed.get("originalPrice"))
-                result["in_stock"] = parsed.get("isAvailable", True)
+        if "price" in record:
+            result["price"] = _extract_price(record.get("price"))
+            result["card_price"] = _extract_price(record.get("cardPrice"))
+            result["old_price"] = _extract_price(record.get("originalPrice"))
+            result["in_stock"] = record.get("isAvailable", True)
 
-                if result["price"] and result["old_price"] and result["old_price"] > result["price"]:
-                    result["discount_percent"] = round((1 - result["price"] / result["old_price"]) * 100)
+            if result["price"] and result["old_price"] and result["old_price"] > result["price"]:
+                result["discount_percent"] = round((1 - result["price"] / result["old_price"]) * 100)
 
-            if "webProductHeading" in key:
-                result["name"] = parsed.get("title")
-                result["title"] = parsed.get("title")
+        if "title" in record:
+            result["name"] = record.get("title")
+            result["title"] = record.get("title")
 
-            if "webGallery" in key:
-                covers = parsed.get("covers") or []
-                if covers:
-                    result["image_url"] = covers[0].get("link")
+        if record.get("image"):
+            result["image_url"] = record.get("image")
 
-            if "webReviewProductScore" in key:
-                result["rating"] = parsed.get("score")
-                result["feedbacks"] = parsed.get("count")
+        if "score" in record:
+            result["rating"] = record.get("score")
+            result["feedbacks"] = record.get("count")
 
-        result["product_url"] = f"https://www.ozon.ru/product/{sku}/"
         return result
 
     def _empty_product(self, sku: str, error: str | None = None) -> dict[str, Any]:
@@ -6,106 +6,42 @@ import asyncio
 import logging
 import atexit
 import os
-import time
-import random
 from typing import Any, Iterable
-from datetime import datetime, timedelta
 
-import requests
-from requests.adapters import HTTPAdapter
-from urllib3.util.retry import Retry
+import aiohttp
 
 from bot.parsers.base import BaseParser
+from bot.utils.wb_basket import build_image_url, ensure_baskets_known
+from bot.utils.wb_http import get_wb_session
+from bot.utils.wb_identities import get_identity_pool
 
 log = logging.getLogger(__name__)
 
-# ============================================================================
-# Прокси (опционально)
-# ============================================================================
-
-WB_PROXY_URL = os.getenv("WB_PROXY_URL", "").strip()
-PROXIES: dict[str, str] | None = None
-if WB_PROXY_URL:
-    PROXIES = {"http": WB_PROXY_URL, "https": WB_PROXY_URL}
-
 # ============================================================================
 # Константы
 # ============================================================================
 
-CONNECT_TIMEOUT = 10
-READ_TIMEOUT = 30
-BATCH_SIZE = 50  # Товаров за один запрос (WB позволяет до 100)
-COOKIES_REFRESH_HOURS = 2  # Обновлять cookies каждые N часов
-
-USER_AGENTS = [
-    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
-]
-
-# Глобальное хранилище cookies
-_cookies_cache: dict[str, Any] = {}
-_cookies_updated: datetime | None = None
-
-
-# ============================================================================
-# Получение cookies через Selenium
-# ============================================================================
-
-def _get_fresh_cookies() -> dict[str, str]:
-    """Получает свежие cookies через undetected-chromedriver."""
-    global _cookies_cache, _cookies_updated
-    
-    # Проверяем, нужно ли обновлять
-    if _cookies_updated and _cookies_cache:
-        age = datetime.now() - _cookies_updated
-        if age < timedelta(hours=COOKIES_REFRESH_HOURS):
-            log.debug("Using cached cookies (age: %s)", age)
-            return _cookies_cache
-    
-    log.info("Refreshing WB cookies via Selenium...")
-    
-    try:
-        import undetected_chromedriver as uc
-        
-        options = uc.ChromeOptions()
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        
-        driver = uc.Chrome(options=options)
-        
-        try:
-            driver.get("https://www.wildberries.ru/")
-            time.sleep(5)
-            
-            cookies = {}
-            for cookie in driver.get_cookies():
-                cookies[cookie['name']] = cookie['value']
-            
-            _cookies_cache = cookies
-            _cookies_updated = datetime.now()
-            
-            log.info("WB cookies refreshed, count: %d", len(cookies))
-            return cookies
-            
-        finally:
-            try:
-                driver.quit()
-            except:
-                pass
-                
-    except Exception as e:
-        log.error("Failed to get WB cookies: %s", e)
-        return _cookies_cache or {}
-
+MAX_BATCH_SIZE = 100  # Лимит cards/v4/detail на один запрос
+MIN_BATCH_SIZE = 10
+BATCH_SIZE = min(int(os.getenv("WB_BATCH_SIZE", str(MAX_BATCH_SIZE))), MAX_BATCH_SIZE)  # Стартовый размер
+MAX_INFLIGHT_BATCHES = int(os.getenv("WB_MAX_INFLIGHT_BATCHES", "8"))  # Одновременных batch-запросов
+# После стольких полных batch'ей подряд без обрезки размер batch растёт на BATCH_GROW_STEP
+BATCH_GROW_AFTER = int(os.getenv("WB_BATCH_GROW_AFTER", "20"))
+BATCH_GROW_STEP = int(os.getenv("WB_BATCH_GROW_STEP", "10"))
+MAX_RETRIES = 3
+RETRY_BACKOFF = 1.0
+# Повтор на 429/498 идёт через другую identity (см. bot.utils.wb_identities)
+RETRY_STATUSES = (429, 498, 500, 502, 503, 504)
 
 # ============================================================================
 # API запросы
 # ============================================================================
 
-def _get_headers() -> dict[str, str]:
+def _get_headers(user_agent: str) -> dict[str, str]:
     return {
         "Accept": "*/*",
         "Accept-Language": "ru,en;q=0.9",
-        "User-Agent": random.choice(USER_AGENTS),
+        "User-Agent": user_agent,
         "Referer": "https://www.wildberries.ru/",
         "x-requested-with": "XMLHttpRequest",
         "sec-fetch-dest": "empty",
@@ -114,32 +50,7 @@ def _get_headers() -> dict[str, str]:
     }
 
 
-def _create_session() -> requests.Session:
-    session = requests.Session()
-    retry_strategy = Retry(
-        total=3,
-        backoff_factor=1.0,
-        status_forcelist=[500, 502, 503, 504],
-        allowed_methods=["GET"],
-        raise_on_status=False,
-    )
-    adapter = HTTPAdapter(max_retries=retry_strategy)
-    session.mount("http://", adapter)
-    session.mount("https://", adapter)
-    return session
-
-
-_session: requests.Session | None = None
-
-
-def _get_session() -> requests.Session:
-    global _session
-    if _session is None:
-        _session = _create_session()
-    return _session
-
-
-def _fetch_products_batch(nm_ids: list[int]) -> list[dict[str, Any]]:
+async def _fetch_products_batch(nm_ids: list[int]) -> list[dict[str, Any]]:
     """
     Получает данные по batch товаров через внутренний API WB.
     
@@ -148,76 +59,61 @@ def _fetch_products_batch(nm_ids: list[int]) -> list[dict[str, Any]]:
     if not nm_ids:
         return []
     
-    cookies = _get_fresh_cookies()
-    if not cookies:
-        log.warning("No cookies available, cannot fetch products")
-        return []
-    
     nm_string = ";".join(str(x) for x in nm_ids)
     url = f"https://www.wildberries.ru/__internal/u-card/cards/v4/detail?appType=1&curr=rub&dest=12354108&spp=30&lang=ru&nm={nm_string}"
     
-    session = _get_session()
+    session = get_wb_session()
+    pool = get_identity_pool()
     
-    try:
-        resp = session.get(
-            url,
-            headers=_get_headers(),
-            cookies=cookies,
-            timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
-        )
-        
-        if resp.status_code == 200:
-            data = resp.json()
-            products = data.get("data", {}).get("products", [])
-            if not products:
-                products = data.get("products", [])
-            return products
-            
-        elif resp.status_code == 498:
-            # Cookies протухли, сбрасываем кэш
-            global _cookies_cache, _cookies_updated
-            _cookies_cache = {}
-            _cookies_updated = None
-            log.warning("WB returned 498, cookies expired")
-            
-        else:
-            log.warning("WB API error: %d", resp.status_code)
-            
-    except Exception as e:
-        log.error("WB API request failed: %s", e)
+    for attempt in range(MAX_RETRIES + 1):
+        retry_delay = RETRY_BACKOFF * (2 ** attempt)
+        async with pool.lease() as identity:
+            cookies = await identity.cookies.wait_ready()
+            if not cookies:
+                log.warning("No cookies available (%s), cannot fetch products", identity.name)
+                return []
+
+            await identity.limiter.acquire()
+            try:
+                async with session.get(
+                    url,
+                    headers=_get_headers(identity.user_agent),
+                    cookies=cookies,
+                    proxy=identity.proxy,
+                ) as resp:
+                    pool.report(identity, resp.status)
+
+                    if resp.status == 200:
+                        data = await resp.json(content_type=None)
+                        products = data.get("data", {}).get("products", [])
+                        if not products:
+                            products = data.get("products", [])
+                        return products
+
+                    if resp.status == 498:
+                        # Cookies протухли — identity обновит их в фоне
+                        log.warning("WB returned 498 (%s), cookies expired", identity.name)
+
+                    if resp.status not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                        log.warning("WB API error: %d", resp.status)
+                        return []
+
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                # Таймаут/обрыв соединения — повторяем с тем же backoff, что и 429/5xx
+                if attempt >= MAX_RETRIES:
+                    log.error("WB API request failed after %d attempts: %r", attempt + 1, e)
+                    return []
+                log.warning("WB API request failed (attempt %d), retrying: %r", attempt + 1, e)
+
+            except Exception as e:
+                log.error("WB API request failed: %s", e)
+                return []
+
+        await asyncio.sleep(retry_delay)
     
     return []
 
 
-# ============================================================================
-# Вспомогательные функции (basket API для картинок)
-# ============================================================================
-
-def _get_basket_number(vol: int) -> int:
-    """Определяет номер basket по vol (актуальная таблица WB)."""
-    ranges = [
-        (143, 1), (287, 2), (431, 3), (719, 4), (1007, 5),
-        (1061, 6), (1115, 7), (1169, 8), (1313, 9), (1601, 10),
-        (1655, 11), (1919, 12), (2045, 13), (2189, 14), (2405, 15),
-        (2621, 16), (2837, 17), (3053, 18), (3269, 19), (3485, 20),
-        (3701, 21), (3917, 22), (4133, 23), (4349, 24), (4565, 25),
-        (4899, 26), (5399, 27), (5599, 28), (5859, 29), (6259, 30),
-        (6459, 31), (6659, 32), (6859, 33), (7059, 34), (7259, 35),
-        (7459, 36), (7659, 37), (7859, 38), (8059, 39), (8259, 40),
-    ]
-    for max_vol, basket in ranges:
-        if vol <= max_vol:
-            return basket
-    return 41
-
-
-def _build_image_url(nm_id: int) -> str:
-    vol = nm_id // 100000
-    part = nm_id // 1000
-    basket = _get_basket_number(vol)
-    return f"https://basket-{basket:02d}.wbbasket.ru/vol{vol}/part{part}/{nm_id}/images/big/1.webp"
-
-
 # ============================================================================
 # Основной класс
 # ============================================================================
@@ -225,15 +121,29 @@ def _build_image_url(nm_id: int) -> str:
 class WildberriesParser(BaseParser):
     """
     Парсер Wildberries с гибридным подходом:
-    - Selenium для получения cookies (раз в 2 часа)
+    - Cookies из долгоживущего браузера (фоновое обновление, см. bot.utils.wb_cookies)
     - Внутренний API WB для данных (быстро, batch запросы)
     """
 
     def __init__(self, product_ids: Iterable[int] | None = None) -> None:
-        if product_ids:
-            self._product_ids = [int(i) for i in product_ids]
-        else:
-            self._product_ids = []
+        self.set_product_ids(product_ids)
+
+        # Текущий размер batch: уменьшается, если WB начинает обрезать ответы,
+        # и растёт обратно (до BATCH_SIZE) после серии полных ответов
+        self._batch_size = max(MIN_BATCH_SIZE, BATCH_SIZE)
+        self._full_streak = 0
+        # nm_id, которых WB не отдал и при дозапросе хвоста (мёртвые) —
+        # из-за них batch больше не считается обрезанным
+        self._dead_tail: set[int] = set()
+
+    def set_product_ids(self, product_ids: Iterable[int] | None) -> None:
+        """Обновляет список nm_id (состояние batch/лимитов сохраняется)."""
+        self._product_ids = [int(i) for i in product_ids] if product_ids else []
+
+    @property
+    def batch_size(self) -> int:
+        """Размер batch, который парсер сейчас использует для запросов к WB."""
+        return self._batch_size
 
     async def fetch_products(self) -> Iterable[Any]:
         """Возвращает список nm_id для парсинга."""
@@ -245,7 +155,8 @@ class WildberriesParser(BaseParser):
         """Парсит один товар."""
         nm_id = int(raw) if not isinstance(raw, int) else raw
         
-        products = await asyncio.to_thread(_fetch_products_batch, [nm_id])
+        products = await _fetch_products_batch([nm_id])
+        await ensure_baskets_known([nm_id])
         
         if products:
             return self._convert_product(products[0])
@@ -256,30 +167,111 @@ class WildberriesParser(BaseParser):
             "name": f"Товар {nm_id}",
             "price": None,
             "product_url": f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx",
-            "image_url": _build_image_url(nm_id),
+            "image_url": build_image_url(nm_id),
         }
 
     async def parse_products_batch(self, nm_ids: list[int]) -> list[dict[str, Any]]:
-        """Парсит batch товаров за один запрос."""
+        """
+        Парсит товары batch'ами, держа в полёте до MAX_INFLIGHT_BATCHES запросов.
+
+        Это единственный слой нарезки: batch'и упаковываются до self.batch_size
+        (по умолчанию лимит API — 100), темп задают лимитеры identity из пула.
+        """
+        size = self._batch_size
+        batches = [nm_ids[i:i + size] for i in range(0, len(nm_ids), size)]
+        semaphore = asyncio.Semaphore(max(1, MAX_INFLIGHT_BATCHES))
+
+        async def _run(batch: list[int]) -> list[dict[str, Any]]:
+            async with semaphore:
+                return await self._fetch_batch_untruncated(batch)
+
+        batch_results = await asyncio.gather(*(_run(b) for b in batches))
+        # Новые vol (за пределами таблицы basket) — находим хост до сборки image_url
+        await ensure_baskets_known(nm_ids)
+        log.debug(
+            "WB: %d batches done, batch_size=%d, rates=[%s]",
+            len(batches),
+            self._batch_size,
+            ", ".join(f"{i.name}={i.limiter.rate:.2f}" for i in get_identity_pool().identities),
+        )
+
         results = []
-        
-        for i in range(0, len(nm_ids), BATCH_SIZE):
-            batch = nm_ids[i:i + BATCH_SIZE]
-            
-            products = await asyncio.to_thread(_fetch_products_batch, batch)
-            
+        for products in batch_results:
             for p in products:
                 try:
                     result = self._convert_product(p)
                     results.append(result)
                 except Exception as e:
                     log.warning("Failed to convert product: %s", e)
-            
-            if i + BATCH_SIZE < len(nm_ids):
-                await asyncio.sleep(0.5)
         
         return results
 
+    async def _fetch_batch_untruncated(self, batch: list[int]) -> list[dict[str, Any]]:
+        """
+        Запрашивает batch и дозапрашивает «хвост», если WB обрезал ответ.
+
+        Хвост — всё, что идёт после последнего отданного товара (без nm_id,
+        уже известных как мёртвые). Если дозапрос хвоста вернул товары — это
+        была обрезка, и размер batch уменьшается до фактически отданного
+        количества. Если хвост пустой — это просто мёртвые товары: они
+        запоминаются, и в следующих циклах дозапрос из-за них не делается.
+        """
+        full_size = len(batch) >= self._batch_size
+        truncated = False
+
+        products = await _fetch_products_batch(batch)
+        self._dead_tail.difference_update(p.get("id") for p in products)
+        tail = self._missing_tail(batch, products)
+
+        while remaining := [nm_id for nm_id in tail if nm_id not in self._dead_tail]:
+            tail_products = await _fetch_products_batch(remaining)
+            if not tail_products:
+                self._dead_tail.update(remaining)
+                break
+
+            truncated = True
+            served = len(batch) - len(tail)
+            if served < self._batch_size:
+                self._batch_size = max(MIN_BATCH_SIZE, served)
+                log.warning(
+                    "WB: truncated response (%d/%d), batch size -> %d",
+                    served, len(batch), self._batch_size,
+                )
+
+            self._dead_tail.difference_update(p.get("id") for p in tail_products)
+            products.extend(tail_products)
+            batch = remaining
+            tail = self._missing_tail(batch, tail_products)
+
+        self._track_full_response(full_size, truncated)
+        return products
+
+    def _track_full_response(self, full_size: bool, truncated: bool) -> None:
+        """Серия полных batch'ей без обрезки — пробуем batch побольше."""
+        if truncated:
+            self._full_streak = 0
+            return
+        if not full_size or self._batch_size >= BATCH_SIZE:
+            return
+
+        self._full_streak += 1
+        if self._full_streak >= BATCH_GROW_AFTER:
+            self._full_streak = 0
+            self._batch_size = min(BATCH_SIZE, self._batch_size + BATCH_GROW_STEP)
+            log.info("WB: %d full responses in a row, batch size -> %d", BATCH_GROW_AFTER, self._batch_size)
+
+    @staticmethod
+    def _missing_tail(batch: list[int], products: list[dict[str, Any]]) -> list[int]:
+        """Возвращает часть batch после последнего товара, который WB отдал."""
+        if not products:
+            return []
+
+        returned = {p.get("id") for p in products}
+        last_served = max((idx for idx, nm_id in enumerate(batch) if nm_id in returned), default=-1)
+        if last_served < 0:
+            return []
+        return batch[last_served + 1:]
+
     def _convert_product(self, p: dict[str, Any]) -> dict[str, Any]:
         """Конвертирует сырые данные API в наш формат."""
         nm_id = p.get("id")
@@ -328,6 +320,6 @@ class WildberriesParser(BaseParser):
             "rating": p.get("reviewRating"),
             "feedbacks": p.get("feedbacks", 0),
             "product_url": f"https://www.wildberries.ru/catalog/{nm_id}/detail.aspx",
-            "image_url": _build_image_url(nm_id),
+            "image_url": build_image_url(nm_id),
             "pics": p.get("pics", 1),
         }
\ No newline at end of file
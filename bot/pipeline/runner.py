@@ -5,7 +5,8 @@ from __future__ import annotations
 import asyncio
 import logging
 import os
-from collections.abc import Iterable
+from collections.abc import AsyncIterator, Iterable
+from contextlib import aclosing
 from typing import Any
 
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
@@ -25,9 +26,15 @@ YIELD_EVERY_N_ITEMS = int(os.getenv("YIELD_EVERY_N_ITEMS", "20"))
 AUTO_CLEANUP_ENABLED = os.getenv("AUTO_CLEANUP_ENABLED", "true").lower() in ("true", "1", "yes")
 TARGET_PRODUCT_COUNT = int(os.getenv("TARGET_PRODUCT_COUNT", "3000"))
 
-# Размер батча для парсинга
+# Размер батча для парсинга (для парсеров без собственной нарезки, см. parser.batch_size)
 BATCH_SIZE = int(os.getenv("PARSE_BATCH_SIZE", "50"))
 
+# Потоковый pipeline: кусок для парсеров с собственной нарезкой (WB качает его параллельно)
+PIPELINE_CHUNK_SIZE = int(os.getenv("PIPELINE_CHUNK_SIZE", "800"))
+# Глубина очередей между стадиями (пачек parse -> detect, товаров detect -> post)
+PIPELINE_QUEUE_DEPTH = int(os.getenv("PIPELINE_QUEUE_DEPTH", "2"))
+PIPELINE_POST_QUEUE_SIZE = int(os.getenv("PIPELINE_POST_QUEUE_SIZE", "200"))
+
 
 class PipelineRunner:
     def __init__(
@@ -81,86 +88,123 @@ class PipelineRunner:
 
         raw_list = list(raw_items)
 
-        # Парсинг: batch или по одному
-        parsed = await self._parse_products(parser, raw_list, platform)
-
-        filtered = await self._filter.filter_products_async(parsed)
-        self._log.info(
-            "Pipeline %s: fetched=%s parsed=%s filtered=%s",
-            platform.value,
-            len(raw_list),
-            len(parsed),
-            len(filtered),
-        )
-
+        # Стадии parse -> filter/detect -> post связаны ограниченными очередями:
+        # находки публикуются сразу после своей пачки, а в памяти одновременно
+        # живут только пачки, которые уже в очередях
+        parsed_q: asyncio.Queue[list[dict[str, Any]] | None] = asyncio.Queue(maxsize=PIPELINE_QUEUE_DEPTH)
+        post_q: asyncio.Queue[dict[str, Any] | None] = asyncio.Queue(maxsize=PIPELINE_POST_QUEUE_SIZE)
+
+        stats = {
+            "parsed": 0, "filtered": 0, "new": 0, "changed": 0,
+            "stable": 0, "unstable": 0, "just_stabilized": 0,
+            "posted": 0, "skipped": 0,
+        }
         dead_products: list[str] = []
 
-        async with self._session_factory() as session:
+        # Маркер конца (None) кладётся только при штатном завершении: если стадию
+        # отменили, соседей уже отменяет TaskGroup, а put в полную очередь завис бы
+        async def parse_stage() -> None:
             try:
-                changes = await detect_and_save_changes(session, platform_code=platform, items=filtered)
-
-                # Логируем статистику стабильности
-                stable_count = sum(1 for ch in changes if ch.is_stable)
-                unstable_count = sum(1 for ch in changes if not ch.is_stable and not ch.is_new)
-                just_stabilized_count = sum(1 for ch in changes if ch.just_stabilized)
-                self._log.info(
-                    "Stability stats: stable=%d, unstable=%d, just_stabilized=%d",
-                    stable_count,
-                    unstable_count,
-                    just_stabilized_count,
-                )
-
-                to_publish = self._select_for_publish(changes, filtered)
+                async with aclosing(self._parse_stream(parser, raw_list, platform)) as chunks:
+                    async for chunk in chunks:
+                        if chunk:
+                            stats["parsed"] += len(chunk)
+                            await parsed_q.put(chunk)
+            except Exception:
+                self._log.exception("Parse stage failed: %s", platform.value)
+            await parsed_q.put(None)
 
-                posted = 0
-                skipped = 0
+        async def detect_stage() -> None:
+            while (chunk := await parsed_q.get()) is not None:
+                try:
+                    filtered = await self._filter.filter_products_async(chunk)
+                except Exception:
+                    self._log.exception("Filter step failed: %s", platform.value)
+                    continue
+                stats["filtered"] += len(filtered)
+                if not filtered:
+                    continue
 
-                for item in to_publish:
+                async with self._session_factory() as session:
                     try:
-                        ok = await self._poster.post_product(item)
-                    except ProductUnavailableError as e:
-                        self._log.warning("Skipped unavailable: %s", e)
-                        skipped += 1
-                        if e.external_id:
-                            dead_products.append(e.external_id)
+                        changes = await detect_and_save_changes(session, platform_code=platform, items=filtered)
+                        to_publish = self._select_for_publish(changes, filtered)
+                        await session.commit()
+                    except Exception:
+                        await session.rollback()
+                        self._log.exception("Pipeline DB step failed: %s", platform.value)
                         continue
-                    except ProductUnavailableError as e:
-                        self._log.warning("Skipped unavailable: %s", e)
-                        skipped += 1
 
-                        # Для OZON НЕ удаляем товар из БД только из-за отсутствия картинки:
-                        # это может быть временная проблема CDN/403.
-                        if platform != PlatformCode.OZON:
-                            if e.external_id:
-                                dead_products.append(e.external_id)
+                stats["new"] += sum(1 for ch in changes if ch.is_new)
+                stats["changed"] += sum(1 for ch in changes if ch.has_changes)
+                stats["stable"] += sum(1 for ch in changes if ch.is_stable)
+                stats["unstable"] += sum(1 for ch in changes if not ch.is_stable and not ch.is_new)
+                stats["just_stabilized"] += sum(1 for ch in changes if ch.just_stabilized)
 
-                        continue
-
-                    if not ok:
-                        self._log.info("Posting rate limit reached")
-                        break
+                for item in to_publish:
+                    await post_q.put(item)
+            await post_q.put(None)
+
+        async def post_stage() -> None:
+            limit_reached = False
+            while (item := await post_q.get()) is not None:
+                # После лимита постов очередь просто вычитываем, чтобы не тормозить детект
+                if limit_reached:
+                    continue
+                try:
+                    ok = await self._poster.post_product(item)
+                except ProductUnavailableError as e:
+                    self._log.warning("Skipped unavailable: %s", e)
+                    stats["skipped"] += 1
+                    if e.external_id:
+                        dead_products.append(e.external_id)
+                    continue
+                except Exception:
+                    self._log.exception("Failed to post %s", item.get("external_id"))
+                    continue
 
-                    posted += 1
+                if not ok:
+                    self._log.info("Posting rate limit reached")
+                    limit_reached = True
+                    continue
 
-                await session.commit()
+                stats["posted"] += 1
 
-                self._log.info(
-                    "Pipeline finished: %s new=%s changed=%s posted=%s skipped=%s dead=%s",
-                    platform.value,
-                    sum(1 for ch in changes if ch.is_new),
-                    sum(1 for ch in changes if ch.has_changes),
-                    posted,
-                    skipped,
-                    len(dead_products),
-                )
+        # Упавшая стадия отменяет остальные: иначе соседи ждут её у очереди вечно,
+        # а с max_instances=1 задача платформы больше не запустится
+        try:
+            async with asyncio.TaskGroup() as tg:
+                tg.create_task(parse_stage())
+                tg.create_task(detect_stage())
+                tg.create_task(post_stage())
+        except* Exception as eg:
+            self._log.error("Pipeline %s: stage failed, run aborted", platform.value, exc_info=eg)
 
-            except Exception:
-                await session.rollback()
-                self._log.exception("Pipeline DB step failed: %s", platform.value)
-                return
+        self._log.info(
+            "Pipeline %s: fetched=%s parsed=%s filtered=%s",
+            platform.value,
+            len(raw_list),
+            stats["parsed"],
+            stats["filtered"],
+        )
+        self._log.info(
+            "Stability stats: stable=%d, unstable=%d, just_stabilized=%d",
+            stats["stable"],
+            stats["unstable"],
+            stats["just_stabilized"],
+        )
+        self._log.info(
+            "Pipeline finished: %s new=%s changed=%s posted=%s skipped=%s dead=%s",
+            platform.value,
+            stats["new"],
+            stats["changed"],
+            stats["posted"],
+            stats["skipped"],
+            len(dead_products),
+        )
 
         # После основного pipeline — удаляем мёртвых и добираем новых
-        # Для OZON refill делаем внутри _parse_products (auto-refill), поэтому тут не вызываем _cleanup_and_refill
+        # Для OZON refill делаем внутри _parse_ozon (auto-refill), поэтому тут не вызываем _cleanup_and_refill
         if dead_products and AUTO_CLEANUP_ENABLED and self._product_manager and platform != PlatformCode.OZON:
             await self._cleanup_and_refill(platform, dead_products)
 
@@ -189,17 +233,21 @@ class PipelineRunner:
                         if self._product_manager and hasattr(self._product_manager, "get_refill_categories"):
                             queries = await self._product_manager.get_refill_categories()
 
+                        existing_ids = set(await self._product_manager.get_product_ids(PlatformCode.OZON))
+
                         # Собираем кандидатов равномерно по запросам (быстро, без прокрутки до 3000)
                         if queries and hasattr(parser, "collect_skus_by_queries"):
-                            target_for_collect = min(300, max(need * 10, need + 30))
-                            collected_ids = await parser.collect_skus_by_queries(queries, target=target_for_collect)
+                            # уже известные SKU исключаем сразу — кэш выдачи не гоняет их повторно
+                            target_for_collect = min(300, max(need * 2, need + 10))
+                            collected_ids = await parser.collect_skus_by_queries(
+                                queries, target=target_for_collect, exclude=existing_ids,
+                            )
                         else:
                             # fallback: старый COLLECT если queries пустые или метода ещё нет
                             collected = await getattr(parser, "parse_products_batch")([])  # COLLECT
                             collected_ids = [str(x.get("external_id")) for x in collected if isinstance(x, dict)]
                             collected_ids = [x for x in collected_ids if x and x.isdigit()]
 
-                        existing_ids = set(await self._product_manager.get_product_ids(PlatformCode.OZON))
                         new_ids: list[str] = []
                         for eid in collected_ids:
                             if eid in existing_ids:
@@ -225,155 +273,40 @@ class PipelineRunner:
                 self._log.exception("OZON: failed to remove dead products")
 
 
-    async def _parse_products(
+    async def _parse_stream(
         self,
         parser: BaseParser,
         raw_list: list[Any],
         platform: PlatformCode,
-    ) -> list[dict[str, Any]]:
-        """Парсит товары."""
-        
-        # === OZON ===
-        if platform == PlatformCode.OZON and hasattr(parser, "parse_products_batch"):
-
-            # 1) Если raw_list не пустой — обычный MONITOR
-            if raw_list:
-                self._log.info("OZON: MONITOR mode (%d products from DB)", len(raw_list))
-                try:
-                    results = await parser.parse_products_batch(raw_list)
-                    self._log.info("OZON monitor returned %d items", len(results) if results else 0)
-                    # === OZON AUTO-REFILL до TARGET_PRODUCT_COUNT ===
-                    # Если после удаления "мёртвых" стало меньше 3000 — добираем недостающее через COLLECT.
-                    if self._product_manager:
-                        try:
-                            db_count = await self._product_manager.get_product_count(PlatformCode.OZON)
-                        except Exception:
-                            self._log.exception("OZON: failed to get count for auto-refill")
-                            db_count = TARGET_PRODUCT_COUNT
-
-                        if db_count < TARGET_PRODUCT_COUNT:
-                            need = TARGET_PRODUCT_COUNT - db_count
-                            self._log.warning("OZON: auto-refill needed: %d (current=%d target=%d)", need, db_count, TARGET_PRODUCT_COUNT)
-
-                            try:
-                                # Берём общий список категорий/тем (из БД/ENV)
-                                queries: list[str] = []
-                                if self._product_manager and hasattr(self._product_manager, "get_refill_categories"):
-                                    queries = await self._product_manager.get_refill_categories()
-
-                                # Собираем кандидатов равномерно по запросам
-                                if queries and hasattr(parser, "collect_skus_by_queries"):
-                                    # небольшой запас, но без лишней нагрузки при need=1..3
-                                    target_for_collect = min(300, max(need * 10, need + 30))
-                                    collected_ids = await parser.collect_skus_by_queries(queries, target=target_for_collect)
-                                else:
-                                    # fallback: старый COLLECT если queries пустые или метод ещё не добавлен
-                                    collected = await parser.parse_products_batch([])  # COLLECT
-                                    collected_ids = [str(x.get("external_id")) for x in collected if isinstance(x, dict)]
-                                    collected_ids = [x for x in collected_ids if x and x.isdigit()]
-
-                                existing_ids = set(await self._product_manager.get_product_ids(PlatformCode.OZON))
-                                new_ids: list[str] = []
-                                for eid in collected_ids:
-                                    if eid in existing_ids:
-                                        continue
-                                    if eid in new_ids:
-                                        continue
-                                    new_ids.append(eid)
-                                    if len(new_ids) >= need:
-                                        break
-
-                                if new_ids:
-                                    added, skipped = await self._product_manager.add_products(PlatformCode.OZON, new_ids)
-                                    self._log.info("OZON auto-refill: added=%d skipped=%d", added, skipped)
-
-                                removed = await self._product_manager.trim_to_target(PlatformCode.OZON, TARGET_PRODUCT_COUNT)
-                                if removed:
-                                    self._log.info("OZON auto-refill: trimmed extra removed=%d", removed)
-
-                            except Exception:
-                                self._log.exception("OZON auto-refill failed")
-                    return results if isinstance(results, list) else []
-                except Exception:
-                    self._log.exception("OZON monitor failed")
-                    return []
-
-            # 2) raw_list пустой — но это может быть из-за "пустого парсера".
-            #    Проверяем БД и если там есть товары — форсим MONITOR.
-            db_count = 0
-            if self._product_manager:
-                try:
-                    db_count = await self._product_manager.get_product_count(PlatformCode.OZON)
-                except Exception:
-                    self._log.exception("OZON: failed to get product count from DB")
-                    db_count = 0
-
-            if db_count > 0 and self._product_manager:
-                self._log.warning(
-                    "OZON: raw_list empty, but DB has %d products -> forcing MONITOR from DB",
-                    db_count,
-                )
-                try:
-                    ids = await self._product_manager.get_product_ids(PlatformCode.OZON)
-                    results = await parser.parse_products_batch(ids)
-                    self._log.info("OZON monitor returned %d items", len(results) if results else 0)
-                    return results if isinstance(results, list) else []
-                except Exception:
-                    self._log.exception("OZON forced MONITOR from DB failed")
-                    return []
-
-            # 3) БД реально пустая — делаем COLLECT
-            self._log.info("OZON: COLLECT mode (DB empty)")
-
-            try:
-                results = await parser.parse_products_batch([])
-
-                ids: list[str] = []
-                if results:
-                    ids = [str(x.get("external_id")) for x in results if isinstance(x, dict)]
-                    ids = [x for x in ids if x and x.isdigit()]
-                    ids = ids[:TARGET_PRODUCT_COUNT]  # ровно 3000
-
-                if self._product_manager and ids:
-                    added, skipped = await self._product_manager.add_products(PlatformCode.OZON, ids)
-                    self._log.info("OZON COLLECT: saved to DB added=%d skipped=%d", added, skipped)
-
-                    # Приводим базу к ровно TARGET_PRODUCT_COUNT (твой Шаг 2 уже сделал метод trim_to_target)
-                    removed = await self._product_manager.trim_to_target(PlatformCode.OZON, TARGET_PRODUCT_COUNT)
-                    if removed:
-                        self._log.info("OZON: trimmed extra products removed=%d", removed)
-
-                self._log.info("OZON collect returned %d items", len(results) if results else 0)
-
-                # Сразу запускаем MONITOR в этом же запуске (по ровно 3000 ids)
-                if ids:
-                    self._log.info("OZON: switching to MONITOR right after COLLECT (%d products)", len(ids))
-                    monitor_results = await parser.parse_products_batch(ids)
-                    self._log.info(
-                        "OZON monitor after collect returned %d items",
-                        len(monitor_results) if monitor_results else 0,
-                    )
-                    return monitor_results if isinstance(monitor_results, list) else []
+    ) -> AsyncIterator[list[dict[str, Any]]]:
+        """Парсит товары и отдаёт результат пачками по мере готовности."""
 
-                return []
-            except Exception:
-                self._log.exception("OZON collect failed")
-                return []
-
-        parsed: list[dict[str, Any]] = []
+        # === OZON: результаты MONITOR идут по стадиям по мере проверки пачек ===
+        if platform == PlatformCode.OZON and hasattr(parser, "parse_products_batch"):
+            async with aclosing(self._parse_ozon(parser, raw_list)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+            return
 
         # === WB и другие: batch парсинг ===
         if hasattr(parser, "parse_products_batch") and callable(getattr(parser, "parse_products_batch")):
+            # Если парсер сам режет batch'и под лимит API (WB) — отдаём ему крупные куски
+            # (внутри он качает их параллельно), без сна между кусками
+            own_batching = getattr(parser, "batch_size", None) is not None
+            step = PIPELINE_CHUNK_SIZE if own_batching else BATCH_SIZE
+
             self._log.info(
-                "Using BATCH parsing: %d products, batch_size=%d",
+                "Using BATCH parsing: %d products, batch_size=%s, chunk=%d",
                 len(raw_list),
-                BATCH_SIZE,
+                getattr(parser, "batch_size") if own_batching else BATCH_SIZE,
+                step,
             )
 
-            total_batches = (len(raw_list) + BATCH_SIZE - 1) // BATCH_SIZE
+            total_batches = (len(raw_list) + step - 1) // step
+            parsed_count = 0
 
-            for batch_num, i in enumerate(range(0, len(raw_list), BATCH_SIZE), start=1):
-                batch = raw_list[i:i + BATCH_SIZE]
+            for batch_num, i in enumerate(range(0, len(raw_list), step), start=1):
+                batch = raw_list[i:i + step]
 
                 try:
                     batch_ids = [int(x) for x in batch]
@@ -382,9 +315,6 @@ class PipelineRunner:
 
                 try:
                     batch_results = await parser.parse_products_batch(batch_ids)
-                    if isinstance(batch_results, list):
-                        parsed.extend(batch_results)
-
                     self._log.debug(
                         "Batch %d/%d: requested=%d, got=%d",
                         batch_num,
@@ -392,17 +322,24 @@ class PipelineRunner:
                         len(batch_ids),
                         len(batch_results) if isinstance(batch_results, list) else 0,
                     )
+                    if isinstance(batch_results, list):
+                        parsed_count += len(batch_results)
+                        yield batch_results
                 except Exception:
                     self._log.exception("Batch %d/%d parsing failed", batch_num, total_batches)
 
-                if i + BATCH_SIZE < len(raw_list):
+                if not own_batching and i + step < len(raw_list):
                     await asyncio.sleep(0.3)
 
-            self._log.info("Batch parsing complete: %d/%d products parsed", len(parsed), len(raw_list))
-            return parsed
+            if own_batching:
+                self._log.info("Parser batch size in use: %d", getattr(parser, "batch_size"))
+
+            self._log.info("Batch parsing complete: %d/%d products parsed", parsed_count, len(raw_list))
+            return
 
         # === Fallback: по одному ===
         self._log.info("Using SINGLE parsing: %d products", len(raw_list))
+        chunk: list[dict[str, Any]] = []
         for idx, raw in enumerate(raw_list):
             try:
                 item = await parser.parse_product(raw)
@@ -410,22 +347,164 @@ class PipelineRunner:
                 self._log.exception("Failed to parse product #%d", idx)
                 continue
             if isinstance(item, dict):
-                parsed.append(item)
+                chunk.append(item)
+            if len(chunk) >= BATCH_SIZE:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
+
+    async def _monitor_ozon(self, parser: BaseParser, ids: list[Any]) -> AsyncIterator[list[dict[str, Any]]]:
+        """OZON MONITOR: пачки результатов по мере готовности (если парсер умеет stream)."""
+        count = 0
+        if hasattr(parser, "parse_products_stream"):
+            # aclosing: при отмене pipeline вкладки монитора останавливаются сразу
+            async with aclosing(parser.parse_products_stream(ids)) as chunks:
+                async for chunk in chunks:
+                    count += len(chunk)
+                    yield chunk
+        else:
+            results = await parser.parse_products_batch(ids)
+            results = results if isinstance(results, list) else []
+            for i in range(0, len(results), BATCH_SIZE):
+                count += len(results[i:i + BATCH_SIZE])
+                yield results[i:i + BATCH_SIZE]
+        self._log.info("OZON monitor returned %d items", count)
+
+    async def _parse_ozon(self, parser: BaseParser, raw_list: list[Any]) -> AsyncIterator[list[dict[str, Any]]]:
+        """OZON: MONITOR (потоком) с auto-refill после него, либо COLLECT, если БД пустая."""
+        # 1) Если raw_list не пустой — обычный MONITOR
+        if raw_list:
+            self._log.info("OZON: MONITOR mode (%d products from DB)", len(raw_list))
+            try:
+                async with aclosing(self._monitor_ozon(parser, raw_list)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+            except Exception:
+                self._log.exception("OZON monitor failed")
+                return
 
-        return parsed
+            # === OZON AUTO-REFILL до TARGET_PRODUCT_COUNT ===
+            # Если после удаления "мёртвых" стало меньше 3000 — добираем недостающее через COLLECT.
+            # Уже после MONITOR: находки не ждут добора.
+            await self._ozon_auto_refill(parser)
+            return
 
-        # === fallback single ===
-        self._log.info("Using SINGLE parsing: %d products", len(raw_list))
-        for idx, raw in enumerate(raw_list):
+        # 2) raw_list пустой — но это может быть из-за "пустого парсера".
+        #    Проверяем БД и если там есть товары — форсим MONITOR.
+        db_count = 0
+        if self._product_manager:
             try:
-                item = await parser.parse_product(raw)
+                db_count = await self._product_manager.get_product_count(PlatformCode.OZON)
             except Exception:
-                self._log.exception("Failed to parse product #%d", idx)
-                continue
-            if isinstance(item, dict):
-                parsed.append(item)
+                self._log.exception("OZON: failed to get product count from DB")
+                db_count = 0
+
+        if db_count > 0 and self._product_manager:
+            self._log.warning(
+                "OZON: raw_list empty, but DB has %d products -> forcing MONITOR from DB",
+                db_count,
+            )
+            try:
+                ids = await self._product_manager.get_product_ids(PlatformCode.OZON)
+                async with aclosing(self._monitor_ozon(parser, ids)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+            except Exception:
+                self._log.exception("OZON forced MONITOR from DB failed")
+            return
+
+        # 3) БД реально пустая — делаем COLLECT
+        self._log.info("OZON: COLLECT mode (DB empty)")
+
+        try:
+            results = await parser.parse_products_batch([])
+
+            ids: list[str] = []
+            if results:
+                ids = [str(x.get("external_id")) for x in results if isinstance(x, dict)]
+                ids = [x for x in ids if x and x.isdigit()]
+                ids = ids[:TARGET_PRODUCT_COUNT]  # ровно 3000
+
+            if self._product_manager and ids:
+                added, skipped = await self._product_manager.add_products(PlatformCode.OZON, ids)
+                self._log.info("OZON COLLECT: saved to DB added=%d skipped=%d", added, skipped)
+
+                # Приводим базу к ровно TARGET_PRODUCT_COUNT (твой Шаг 2 уже сделал метод trim_to_target)
+                removed = await self._product_manager.trim_to_target(PlatformCode.OZON, TARGET_PRODUCT_COUNT)
+                if removed:
+                    self._log.info("OZON: trimmed extra products removed=%d", removed)
+
+            self._log.info("OZON collect returned %d items", len(results) if results else 0)
+
+            # Сразу запускаем MONITOR в этом же запуске (по ровно 3000 ids)
+            if ids:
+                self._log.info("OZON: switching to MONITOR right after COLLECT (%d products)", len(ids))
+                async with aclosing(self._monitor_ozon(parser, ids)) as chunks:
+                    async for chunk in chunks:
+                        yield chunk
+        except Exception:
+            self._log.exception("OZON collect failed")
+
+    async def _ozon_auto_refill(self, parser: BaseParser) -> None:
+        """Добирает OZON до TARGET_PRODUCT_COUNT через COLLECT по категориям/темам."""
+        if not self._product_manager:
+            return
+
+        try:
+            db_count = await self._product_manager.get_product_count(PlatformCode.OZON)
+        except Exception:
+            self._log.exception("OZON: failed to get count for auto-refill")
+            db_count = TARGET_PRODUCT_COUNT
+
+        if db_count >= TARGET_PRODUCT_COUNT:
+            return
 
-        return parsed
+        need = TARGET_PRODUCT_COUNT - db_count
+        self._log.warning("OZON: auto-refill needed: %d (current=%d target=%d)", need, db_count, TARGET_PRODUCT_COUNT)
+
+        try:
+            # Берём общий список категорий/тем (из БД/ENV)
+            queries: list[str] = []
+            if self._product_manager and hasattr(self._product_manager, "get_refill_categories"):
+                queries = await self._product_manager.get_refill_categories()
+
+            existing_ids = set(await self._product_manager.get_product_ids(PlatformCode.OZON))
+
+            # Собираем кандидатов равномерно по запросам
+            if queries and hasattr(parser, "collect_skus_by_queries"):
+                # известные SKU исключены заранее, поэтому запас небольшой
+                target_for_collect = min(300, max(need * 2, need + 10))
+                collected_ids = await parser.collect_skus_by_queries(
+                    queries, target=target_for_collect, exclude=existing_ids,
+                )
+            else:
+                # fallback: старый COLLECT если queries пустые или метод ещё не добавлен
+                collected = await parser.parse_products_batch([])  # COLLECT
+                collected_ids = [str(x.get("external_id")) for x in collected if isinstance(x, dict)]
+                collected_ids = [x for x in collected_ids if x and x.isdigit()]
+
+            new_ids: list[str] = []
+            for eid in collected_ids:
+                if eid in existing_ids:
+                    continue
+                if eid in new_ids:
+                    continue
+                new_ids.append(eid)
+                if len(new_ids) >= need:
+                    break
+
+            if new_ids:
+                added, skipped = await self._product_manager.add_products(PlatformCode.OZON, new_ids)
+                self._log.info("OZON auto-refill: added=%d skipped=%d", added, skipped)
+
+            removed = await self._product_manager.trim_to_target(PlatformCode.OZON, TARGET_PRODUCT_COUNT)
+            if removed:
+                self._log.info("OZON auto-refill: trimmed extra removed=%d", removed)
+
+        except Exception:
+            self._log.exception("OZON auto-refill failed")
 
     async def _cleanup_and_refill(
         self,
@@ -21,9 +21,9 @@ from aiogram.types import (
     InlineKeyboardButton,
     InlineKeyboardMarkup,
 )
-from playwright.async_api import async_playwright
-
 from bot.config import PostingSettings
+from bot.utils.ozon_images import get_ozon_image_resolver
+from bot.utils.wb_basket import build_image_base, ensure_baskets_known
 
 log = logging.getLogger(__name__)
 
@@ -32,10 +32,6 @@ FALLBACK_IMAGE_PATH = os.getenv("POSTING_FALLBACK_IMAGE", "test.jpg").strip()
 POST_DELAY = float(os.getenv("POSTING_DELAY", "3.0"))
 SKIP_PRODUCTS_WITHOUT_IMAGE = os.getenv("SKIP_PRODUCTS_WITHOUT_IMAGE", "true").lower() in ("true", "1", "yes")
 
-# OZON browser fallback (через CDP)
-OZON_CDP_URL = os.getenv("OZON_CDP_URL", "http://localhost:9222").strip()
-OZON_IMAGE_BROWSER_TIMEOUT_MS = int(os.getenv("OZON_IMAGE_BROWSER_TIMEOUT_MS", "15000"))
-
 
 class ProductUnavailableError(Exception):
     """Товар недоступен (удалён, нет картинки)."""
@@ -118,6 +114,10 @@ class PostingService:
         external_id = product.get("external_id")
         platform = str(product.get("platform", "")).upper()
 
+        # WB: для нового vol сначала находим basket-хост
+        if platform == "WB" and str(external_id or "").isdigit():
+            await ensure_baskets_known([int(external_id)])
+
         # 1) Обычная цепочка URL (как раньше)
         urls_to_try = _build_image_urls_chain(product)
         for url in urls_to_try:
@@ -276,11 +276,7 @@ def _build_image_urls_chain(product: dict[str, Any]) -> list[str]:
     pics = product.get("pics", 1)
     max_pics = min(pics, 5)
 
-    vol = nm_id // 100_000
-    part = nm_id // 1_000
-    basket = _get_basket_number(vol)
-
-    base = f"https://basket-{basket:02d}.wbbasket.ru/vol{vol}/part{part}/{nm_id}/images/big"
+    base = build_image_base(nm_id)
 
     for i in range(1, max_pics + 1):
         urls.append(f"{base}/{i}.webp")
@@ -289,24 +285,6 @@ def _build_image_urls_chain(product: dict[str, Any]) -> list[str]:
     return urls
 
 
-def _get_basket_number(vol: int) -> int:
-    """Определяет номер basket по vol (актуальная таблица WB)."""
-    ranges = [
-        (143, 1), (287, 2), (431, 3), (719, 4), (1007, 5),
-        (1061, 6), (1115, 7), (1169, 8), (1313, 9), (1601, 10),
-        (1655, 11), (1919, 12), (2045, 13), (2189, 14), (2405, 15),
-        (2621, 16), (2837, 17), (3053, 18), (3269, 19), (3485, 20),
-        (3701, 21), (3917, 22), (4133, 23), (4349, 24), (4565, 25),
-        (4899, 26), (5399, 27), (5599, 28), (5859, 29), (6259, 30),
-        (6459, 31), (6659, 32), (6859, 33), (7059, 34), (7259, 35),
-        (7459, 36), (7659, 37), (7859, 38), (8059, 39), (8259, 40),
-    ]
-    for max_vol, basket in ranges:
-        if vol <= max_vol:
-            return basket
-    return 41
-
-
 def _fallback_photo() -> FSInputFile:
     """Возвращает заглушку-картинку."""
     return FSInputFile(FALLBACK_IMAGE_PATH)
@@ -368,55 +346,10 @@ async def _download_image(url: str, timeout: int = 20) -> bytes | None:
 
 async def _resolve_ozon_image_url_via_browser(product_url: str) -> str | None:
     """
-    Открывает страницу OZON в браузерном контексте (CDP) и достаёт og:image/twitter:image.
+    Достаёт og:image/twitter:image со страницы OZON через общий резолвер
+    (своя вкладка в Chrome по CDP, кэш по product_url).
     """
-    if not product_url:
-        return None
-
-    # гарантируем, что Chrome запущен на CDP порту
-    try:
-        from bot.utils.chrome_manager import ensure_chrome_running
-        ok = await ensure_chrome_running()
-        if not ok:
-            return None
-    except Exception:
-        return None
-
-    pw = None
-    try:
-        pw = await async_playwright().start()
-        browser = await pw.chromium.connect_over_cdp(OZON_CDP_URL)
-
-        context = browser.contexts[0] if browser.contexts else await browser.new_context()
-        page = context.pages[0] if context.pages else await context.new_page()
-
-        await page.goto(product_url, wait_until="domcontentloaded", timeout=OZON_IMAGE_BROWSER_TIMEOUT_MS)
-
-        og = await page.eval_on_selector(
-            "meta[property='og:image']",
-            "el => el && el.content ? el.content : null"
-        )
-        if isinstance(og, str) and og.strip():
-            return og.strip()
-
-        tw = await page.eval_on_selector(
-            "meta[name='twitter:image']",
-            "el => el && el.content ? el.content : null"
-        )
-        if isinstance(tw, str) and tw.strip():
-            return tw.strip()
-
-        return None
-
-    except Exception:
-        return None
-
-    finally:
-        try:
-            if pw:
-                await pw.stop()
-        except Exception:
-            pass
+    return await get_ozon_image_resolver().resolve(product_url)
 
 
 def _build_keyboard(url: str | None) -> InlineKeyboardMarkup | None:
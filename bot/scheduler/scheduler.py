@@ -1,8 +1,10 @@
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 from collections.abc import Awaitable, Callable
+from datetime import datetime, timedelta, timezone
 from typing import Any
 
 from apscheduler.jobstores.base import JobLookupError
@@ -11,6 +13,10 @@ from apscheduler.triggers.interval import IntervalTrigger
 
 from bot.config import ParsingIntervals
 
+# Фоновое обслуживание (cleanup/refill): сколько задач одновременно и шаг старта по приоритету
+MAINTENANCE_CONCURRENCY = int(os.getenv("MAINTENANCE_CONCURRENCY", "1"))
+MAINTENANCE_STAGGER_SEC = float(os.getenv("MAINTENANCE_STAGGER_SEC", "5"))
+
 
 def _env_bool(name: str, default: bool) -> bool:
     v = os.getenv(name)
@@ -30,6 +36,7 @@ class SchedulerService:
         enable_wb: bool | None = None,
         enable_ozon: bool | None = None,
         enable_detmir: bool | None = None,
+        run_at_start: bool = False,
     ) -> None:
         self._log = logging.getLogger(self.__class__.__name__)
         self._scheduler = AsyncIOScheduler(
@@ -50,6 +57,11 @@ class SchedulerService:
         self._enable_ozon = enable_ozon if enable_ozon is not None else _env_bool("ENABLE_OZON", True)
         self._enable_detmir = enable_detmir if enable_detmir is not None else _env_bool("ENABLE_DETMIR", True)
 
+        # Первый прогон платформ сразу после старта (вместо initial sync в main)
+        self._run_at_start = run_at_start
+
+        self._maintenance_semaphore = asyncio.Semaphore(max(1, MAINTENANCE_CONCURRENCY))
+
         self._jobs_added = False
 
         self._log.info(
@@ -61,12 +73,15 @@ class SchedulerService:
         if self._jobs_added:
             return
 
+        first_run = {"next_run_time": datetime.now(timezone.utc)} if self._run_at_start else {}
+
         if self._enable_wb:
             self._scheduler.add_job(
                 self._safe("wb", self._wb_task),
                 trigger=IntervalTrigger(seconds=self._intervals.wb_seconds),
                 id="parse_wb",
                 replace_existing=True,
+                **first_run,
             )
         else:
             self._log.info("Scheduler: WB disabled, job not added")
@@ -77,6 +92,7 @@ class SchedulerService:
                 trigger=IntervalTrigger(seconds=self._intervals.ozon_seconds),
                 id="parse_ozon",
                 replace_existing=True,
+                **first_run,
             )
         else:
             self._log.info("Scheduler: OZON disabled, job not added")
@@ -87,12 +103,44 @@ class SchedulerService:
                 trigger=IntervalTrigger(seconds=self._intervals.detmir_seconds),
                 id="parse_detmir",
                 replace_existing=True,
+                **first_run,
             )
         else:
             self._log.info("Scheduler: DETMIR disabled, job not added")
 
         self._jobs_added = True
 
+    def add_maintenance_job(
+        self,
+        name: str,
+        task: Callable[[], Awaitable[Any]],
+        *,
+        seconds: int,
+        run_at_start: bool = True,
+        priority: int = 0,
+    ) -> None:
+        """
+        Фоновая задача обслуживания (cleanup, refill и т.п.).
+
+        - своё расписание (seconds)
+        - одновременно выполняется не больше MAINTENANCE_CONCURRENCY таких задач
+        - при run_at_start первый запуск через priority * MAINTENANCE_STAGGER_SEC
+          (меньше priority — раньше встаёт в очередь)
+        """
+        kwargs: dict[str, Any] = {}
+        if run_at_start:
+            delay = timedelta(seconds=priority * MAINTENANCE_STAGGER_SEC)
+            kwargs["next_run_time"] = datetime.now(timezone.utc) + delay
+
+        self._scheduler.add_job(
+            self._maintenance(name, task),
+            trigger=IntervalTrigger(seconds=seconds),
+            id=f"maintenance_{name}",
+            replace_existing=True,
+            **kwargs,
+        )
+        self._log.info("Scheduler: maintenance job %s every %ds (run_at_start=%s)", name, seconds, run_at_start)
+
     def start(self) -> None:
         self.add_jobs()
         self._scheduler.start()
@@ -122,6 +170,16 @@ class SchedulerService:
 
         return _runner
 
+    def _maintenance(self, name: str, task: Callable[[], Awaitable[Any]]) -> Callable[[], Awaitable[None]]:
+        async def _runner() -> None:
+            async with self._maintenance_semaphore:
+                try:
+                    await task()
+                except Exception:
+                    self._log.exception("Maintenance task failed: %s", name)
+
+        return _runner
+
     async def _wb_placeholder(self) -> None:
         self._log.info("WB parsing task placeholder executed")
 
@@ -2,63 +2,21 @@ from __future__ import annotations
 
 import asyncio
 import logging
-import time
-from datetime import datetime, timedelta
-from typing import Any
+import os
+from typing import Iterable
 
-import requests
+import aiohttp
+
+from bot.parsers.wb import MAX_RETRIES, RETRY_BACKOFF, RETRY_STATUSES
+from bot.utils.search_cache import get_search_cache
+from bot.utils.wb_http import get_wb_session
+from bot.utils.wb_identities import get_identity_pool
 
 log = logging.getLogger(__name__)
 
-# Глобальный кэш cookies
-_cookies_cache: dict[str, str] = {}
-_cookies_updated: datetime | None = None
-COOKIES_REFRESH_HOURS = 2
-
-
-def _get_fresh_cookies() -> dict[str, str]:
-    """Получает свежие cookies через Selenium."""
-    global _cookies_cache, _cookies_updated
-    
-    if _cookies_updated and _cookies_cache:
-        age = datetime.now() - _cookies_updated
-        if age < timedelta(hours=COOKIES_REFRESH_HOURS):
-            return _cookies_cache
-    
-    log.info("Refreshing WB cookies for catalog...")
-    
-    try:
-        import undetected_chromedriver as uc
-        
-        options = uc.ChromeOptions()
-        options.add_argument("--no-sandbox")
-        options.add_argument("--disable-dev-shm-usage")
-        
-        driver = uc.Chrome(options=options)
-        
-        try:
-            driver.get("https://www.wildberries.ru/")
-            time.sleep(5)
-            
-            cookies = {}
-            for cookie in driver.get_cookies():
-                cookies[cookie['name']] = cookie['value']
-            
-            _cookies_cache = cookies
-            _cookies_updated = datetime.now()
-            
-            log.info(f"Cookies refreshed: {len(cookies)}")
-            return cookies
-            
-        finally:
-            try:
-                driver.quit()
-            except:
-                pass
-                
-    except Exception as e:
-        log.error(f"Failed to get cookies: {e}")
-        return _cookies_cache or {}
+SEARCH_MAX_PAGES = int(os.getenv("WB_SEARCH_MAX_PAGES", "50"))
+SEARCH_PAGE_CONCURRENCY = int(os.getenv("WB_SEARCH_PAGE_CONCURRENCY", "4"))
+SEARCH_QUERY_CONCURRENCY = int(os.getenv("WB_SEARCH_QUERY_CONCURRENCY", "4"))
 
 
 class CatalogParser:
@@ -66,12 +24,13 @@ class CatalogParser:
     Парсер каталога WB.
     
     Собирает артикулы товаров по поисковым запросам или категориям.
+    Страницы и запросы качаются параллельно через общий aiohttp-пул
+    и пул identity (cookies/UA/прокси/лимит).
     """
     
     def __init__(self):
         self._headers = {
             "Accept": "*/*",
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
             "Referer": "https://www.wildberries.ru/",
             "x-requested-with": "XMLHttpRequest",
         }
@@ -82,117 +41,202 @@ class CatalogParser:
         query: str,
         max_products: int = 1000,
         dest: str = "-3827418",
+        exclude: Iterable[int] | None = None,
+        seen: set[int] | None = None,
     ) -> list[int]:
         """
         Ищет товары по запросу и возвращает список артикулов.
         
+        Просмотренные страницы запоминаются в кэше выдачи (TTL),
+        повторный поиск отдаёт их без запросов и дочитывает с cursor.
+        
         Args:
             query: Поисковый запрос (например "смартфон", "платье")
             max_products: Максимальное количество товаров
             dest: Регион доставки
+            exclude: Артикулы, которые не нужны (не считаются в max_products)
+            seen: Общее множество уже взятых артикулов (пополняется);
+                то, что забрал другой запрос, сюда не попадёт
             
         Returns:
             Список артикулов (nm_id)
         """
-        cookies = await asyncio.to_thread(_get_fresh_cookies)
+        skip = set(exclude or ())
+        all_ids: list[int] = []
+        if seen is None:
+            seen = set()
         
-        if not cookies:
-            log.error("No cookies available")
-            return []
+        def _take(ids: Iterable[int]) -> None:
+            for nm_id in ids:
+                if len(all_ids) >= max_products:
+                    return
+                if nm_id in seen or nm_id in skip:
+                    continue
+                seen.add(nm_id)
+                all_ids.append(nm_id)
         
-        all_ids: list[int] = []
-        page = 1
-        max_pages = (max_products // 100) + 1
+        # Сначала то, что уже видели в этой выдаче, затем продолжаем с cursor
+        cache = get_search_cache()
+        key = cache.key("wb", query, dest)
+        entry = cache.entry(key)
+        _take(int(x) for x in entry.ids)
         
-        log.info(f"Searching: '{query}', max {max_products} products")
+        log.info(
+            f"Searching: '{query}', max {max_products} products "
+            f"(cached: {len(all_ids)}, resume from page {entry.cursor})"
+        )
         
-        while len(all_ids) < max_products and page <= max_pages:
-            params = {
-                "ab_testing": "false",
-                "appType": "1",
-                "curr": "rub",
-                "dest": dest,
-                "lang": "ru",
-                "page": str(page),
-                "query": query,
-                "resultset": "catalog",
-                "sort": "popular",
-                "spp": "30",
-            }
+        page = entry.cursor
+        done = entry.exhausted
+        while not done and len(all_ids) < max_products and page <= SEARCH_MAX_PAGES:
+            # Окно из нескольких страниц качаем параллельно, разбираем по порядку
+            window = range(page, min(page + SEARCH_PAGE_CONCURRENCY, SEARCH_MAX_PAGES + 1))
+            pages = await asyncio.gather(*(self._fetch_page(query, p, dest) for p in window))
             
+            fetched: list[int] = []
+            cursor = page
+            exhausted = False
+            for p, page_ids in zip(window, pages):
+                if page_ids is None:
+                    # Ошибка — страницу не запоминаем, в следующий раз начнём с неё
+                    done = True
+                    break
+                if not page_ids:
+                    log.info(f"Page {p}: empty, stopping")
+                    done = exhausted = True
+                    break
+                
+                fetched.extend(page_ids)
+                cursor = p + 1
+                _take(page_ids)
+                log.debug(f"Page {p}: {len(page_ids)} products (total: {len(all_ids)})")
+            
+            cache.extend(key, [str(x) for x in fetched], cursor, exhausted)
+            page = window.stop
+        await cache.flush()
+        
+        # Обрезаем до max_products
+        result = all_ids[:max_products]
+        log.info(f"Search '{query}': collected {len(result)} products")
+        
+        return result
+    
+    async def _fetch_page(self, query: str, page: int, dest: str) -> list[int] | None:
+        """Одна страница выдачи. None — ошибка/конец выдачи."""
+        params = {
+            "ab_testing": "false",
+            "appType": "1",
+            "curr": "rub",
+            "dest": dest,
+            "lang": "ru",
+            "page": str(page),
+            "query": query,
+            "resultset": "catalog",
+            "sort": "popular",
+            "spp": "30",
+        }
+        pool = get_identity_pool()
+        session = get_wb_session()
+        
+        # Повторы — как в wb._fetch_products_batch: 429/498/5xx и сетевые ошибки с backoff
+        for attempt in range(MAX_RETRIES + 1):
+            retry_delay = RETRY_BACKOFF * (2 ** attempt)
             try:
-                response = await asyncio.to_thread(
-                    lambda: requests.get(
+                async with pool.lease() as identity:
+                    cookies = await identity.cookies.wait_ready()
+                    if not cookies:
+                        log.error("No cookies available")
+                        return None
+                    
+                    await identity.limiter.acquire()
+                    async with session.get(
                         self._base_url,
                         params=params,
-                        headers=self._headers,
+                        headers={**self._headers, "User-Agent": identity.user_agent},
                         cookies=cookies,
-                        timeout=15,
-                    )
-                )
+                        proxy=identity.proxy,
+                        timeout=aiohttp.ClientTimeout(total=15),
+                    ) as response:
+                        pool.report(identity, response.status)
+                        
+                        if response.status == 200:
+                            data = await response.json(content_type=None)
+                            products = data.get("products", [])
+                            return [p.get("id") for p in products if p.get("id")]
+                        
+                        status = response.status
+                
+                if status not in RETRY_STATUSES or attempt >= MAX_RETRIES:
+                    log.warning(f"Page {page}: HTTP {status}")
+                    return None
+                log.warning(f"Page {page}: HTTP {status}, retrying in {retry_delay:.0f}s...")
+                
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= MAX_RETRIES:
+                    log.error(f"Page {page}: failed after {attempt + 1} attempts: {e!r}")
+                    return None
+                log.warning(f"Page {page}: {e!r}, retrying in {retry_delay:.0f}s...")
                 
-                if response.status_code == 200:
-                    data = response.json()
-                    products = data.get("products", [])
-                    
-                    if not products:
-                        log.info(f"Page {page}: empty, stopping")
-                        break
-                    
-                    page_ids = [p.get("id") for p in products if p.get("id")]
-                    all_ids.extend(page_ids)
-                    
-                    log.debug(f"Page {page}: {len(page_ids)} products (total: {len(all_ids)})")
-                    
-                elif response.status_code == 498:
-                    log.warning("498 - cookies expired, refreshing...")
-                    global _cookies_cache, _cookies_updated
-                    _cookies_cache = {}
-                    _cookies_updated = None
-                    cookies = await asyncio.to_thread(_get_fresh_cookies)
-                    continue
-                    
-                else:
-                    log.warning(f"Page {page}: HTTP {response.status_code}")
-                    break
-                    
             except Exception as e:
                 log.error(f"Page {page}: {e}")
-                break
+                return None
             
-            page += 1
-            await asyncio.sleep(0.3)  # Rate limiting
+            await asyncio.sleep(retry_delay)
         
-        # Обрезаем до max_products
-        result = all_ids[:max_products]
-        log.info(f"Search '{query}': collected {len(result)} products")
-        
-        return result
+        return None
     
     async def collect_from_queries(
         self,
         queries: list[str],
         products_per_query: int = 500,
+        target: int | None = None,
+        exclude: Iterable[int] | None = None,
     ) -> list[int]:
         """
-        Собирает артикулы по нескольким запросам.
+        Собирает артикулы по нескольким запросам (параллельно).
         
         Args:
             queries: Список поисковых запросов
             products_per_query: Товаров с каждого запроса
+            target: Остановиться, как только собрано столько уникальных артикулов
+            exclude: Артикулы, которые не нужны (например, уже в БД)
             
         Returns:
             Уникальный список артикулов
         """
-        all_ids: set[int] = set()
+        skip = set(exclude or ())
+        seen: set[int] = set()  # общее для всех запросов
+        all_ids: dict[int, None] = {}  # упорядоченное множество
+        semaphore = asyncio.Semaphore(max(1, SEARCH_QUERY_CONCURRENCY))
+        enough = asyncio.Event()
         
-        for query in queries:
-            ids = await self.search_products(query, max_products=products_per_query)
-            all_ids.update(ids)
-            log.info(f"After '{query}': total unique {len(all_ids)}")
-            await asyncio.sleep(1)  # Пауза между запросами
+        async def _collect(query: str) -> None:
+            async with semaphore:
+                if enough.is_set():
+                    return
+                try:
+                    ids = await self.search_products(query, max_products=products_per_query, exclude=skip, seen=seen)
+                except Exception as e:
+                    log.error(f"Error searching '{query}': {e}")
+                    return
+                for nm_id in ids:
+                    all_ids.setdefault(nm_id)
+                log.info(f"After '{query}': total unique {len(all_ids)}")
+                if target is not None and len(all_ids) >= target:
+                    enough.set()
+        
+        tasks = [asyncio.create_task(_collect(q)) for q in queries]
+        waiter = asyncio.create_task(enough.wait())
+        try:
+            await asyncio.wait([waiter, asyncio.gather(*tasks, return_exceptions=True)], return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            waiter.cancel()
+            for t in tasks:
+                t.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
         
-        return list(all_ids)
+        result = list(all_ids)
+        return result[:target] if target is not None else result
 
 
 async def collect_products_for_monitoring(
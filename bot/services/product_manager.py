@@ -6,20 +6,34 @@ import asyncio
 import csv
 import logging
 import os
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Iterable, TYPE_CHECKING
+from typing import Any, Callable, Iterable, TYPE_CHECKING
 
 import aiohttp
-from sqlalchemy import select, delete, func
+from sqlalchemy import select, delete, func, update
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
 from bot.db.models import Platform, PlatformCode, Product
+from bot.utils.search_cache import get_search_cache
+from bot.utils.wb_basket import build_image_url, ensure_baskets_known
 
 if TYPE_CHECKING:
     from bot.services.settings_manager import SettingsManager
 
 log = logging.getLogger(__name__)
 
+# Проверка мёртвых товаров (WB)
+CLEANUP_CONCURRENCY = int(os.getenv("CLEANUP_CONCURRENCY", "64"))
+CLEANUP_PER_HOST = int(os.getenv("CLEANUP_PER_HOST", "16"))
+CLEANUP_REQUEST_TIMEOUT_SEC = float(os.getenv("CLEANUP_REQUEST_TIMEOUT_SEC", "10"))
+# Повторы при 429/5xx/таймаутах; после них товар считается «неизвестным» и не удаляется
+CLEANUP_MAX_RETRIES = int(os.getenv("CLEANUP_MAX_RETRIES", "3"))
+CLEANUP_RETRY_BASE_SEC = float(os.getenv("CLEANUP_RETRY_BASE_SEC", "1.0"))
+
+# Только эти ответы CDN означают, что картинки (и товара) больше нет
+DEAD_STATUSES = (404, 410)
+
 
 class ProductManager:
     """Управление списком товаров для мониторинга."""
@@ -145,11 +159,27 @@ class ProductManager:
             
             deleted = result.rowcount
             log.info(f"Removed {deleted} products")
-            
-            return deleted
+        
+        # Иначе добор вернёт их из кэша выдачи
+        cache = get_search_cache()
+        if cache.forget(platform.value, external_ids):
+            await cache.flush()
+        
+        return deleted
 
-    async def get_product_ids(self, platform: PlatformCode) -> list[str]:
-        """Возвращает список артикулов для мониторинга."""
+    async def get_product_ids(
+        self,
+        platform: PlatformCode,
+        *,
+        least_recently_checked: bool = False,
+    ) -> list[str]:
+        """
+        Возвращает список артикулов для мониторинга.
+        
+        least_recently_checked — сначала никогда не проверенные, затем
+        по возрастанию last_checked_at: при неполном цикле (лимиты)
+        хвост списка не голодает.
+        """
         async with self._session_factory() as session:
             platform_obj = await self._get_platform(session, platform)
             if not platform_obj:
@@ -158,10 +188,39 @@ class ProductManager:
             stmt = select(Product.external_id).where(
                 Product.platform_id == platform_obj.id,
             )
+            if least_recently_checked:
+                stmt = stmt.order_by(Product.last_checked_at.asc().nulls_first(), Product.id)
             result = await session.execute(stmt)
             
             return [row[0] for row in result.fetchall()]
 
+    async def mark_checked(self, platform: PlatformCode, external_ids: Iterable[str], batch_size: int = 500) -> int:
+        """Проставляет last_checked_at = now для реально проверенных артикулов."""
+        ids = [str(x) for x in external_ids]
+        if not ids:
+            return 0
+        
+        now = datetime.now(timezone.utc)
+        updated = 0
+        async with self._session_factory() as session:
+            platform_obj = await self._get_platform(session, platform)
+            if not platform_obj:
+                return 0
+            
+            for i in range(0, len(ids), batch_size):
+                res = await session.execute(
+                    update(Product)
+                    .where(
+                        Product.platform_id == platform_obj.id,
+                        Product.external_id.in_(ids[i:i + batch_size]),
+                    )
+                    .values(last_checked_at=now)
+                )
+                updated += res.rowcount or 0
+            await session.commit()
+        
+        return updated
+
     async def get_product_count(self, platform: PlatformCode) -> int:
         """Возвращает количество товаров."""
         async with self._session_factory() as session:
@@ -205,30 +264,18 @@ class ProductManager:
         parser = CatalogParser()
         
         existing_ids = set(await self.get_product_ids(platform))
-        
-        new_ids: list[str] = []
         products_per_query = (need // len(queries)) + 100
         
-        for query in queries:
-            if len(new_ids) >= need:
-                break
-                
-            try:
-                found_ids = await parser.search_products(query, max_products=products_per_query)
-                
-                for nm_id in found_ids:
-                    str_id = str(nm_id)
-                    if str_id not in existing_ids and str_id not in new_ids:
-                        new_ids.append(str_id)
-                        
-                        if len(new_ids) >= need:
-                            break
-                
-                log.info(f"Query '{query}': found {len(found_ids)}, new unique: {len(new_ids)}/{need}")
-                
-            except Exception as e:
-                log.error(f"Error searching '{query}': {e}")
-                continue
+        # Запросы идут параллельно с общим множеством уже виденных,
+        # сбор останавливается, как только набрано need новых
+        found_ids = await parser.collect_from_queries(
+            queries,
+            products_per_query=products_per_query,
+            target=need,
+            exclude={int(i) for i in existing_ids if i.isdigit()},
+        )
+        new_ids = [str(nm_id) for nm_id in found_ids if str(nm_id) not in existing_ids]
+        log.info(f"Refill search: new unique {len(new_ids)}/{need}")
         
         if new_ids:
             added, _ = await self.add_products(platform, new_ids[:need])
@@ -242,16 +289,43 @@ class ProductManager:
         self,
         platform: PlatformCode,
         batch_size: int = 100,
+        progress: Callable[[int, int, int], Any] | None = None,
+        progress_every: int = 500,
     ) -> tuple[int, list[str]]:
-        """Проверяет все товары и удаляет мёртвые."""
+        """
+        Проверяет все товары и удаляет мёртвые.
+
+        Проверка — HEAD картинки (или GET с Range: bytes=0-0, если HEAD не поддержан),
+        пачками по batch_size, внутри пачки параллельно до CLEANUP_CONCURRENCY
+        запросов, не больше CLEANUP_PER_HOST на хост.
+        Мёртвым считается только 404/410; 429/5xx/таймауты повторяются,
+        а если так и не ответили — товар пропускается.
+        progress(checked, total, dead) вызывается каждые progress_every проверок.
+        """
         if platform != PlatformCode.WB:
             log.warning(f"Cleanup not implemented for {platform}")
             return 0, []
         
         all_ids = await self.get_product_ids(platform)
-        log.info(f"Checking {len(all_ids)} products for dead ones...")
+        total = len(all_ids)
+        log.info(f"Checking {total} products for dead ones...")
+
+        # Для новых vol сначала находим реальный basket-хост, иначе живые товары уйдут в мёртвые
+        unresolved = await ensure_baskets_known(int(x) for x in all_ids if str(x).isdigit())
+        if unresolved:
+            # URL картинки для них — только догадка, 404 там ничего не значит
+            before = total
+            all_ids = [x for x in all_ids if not (str(x).isdigit() and int(x) // 100_000 in unresolved)]
+            total = len(all_ids)
+            log.warning(f"Cleanup: skipping {before - total} products in {len(unresolved)} unresolved vols")
         
         dead_ids: list[str] = []
+        unknown = 0
+        checked = 0
+
+        if progress is None:
+            def progress(done: int, count: int, dead: int) -> None:
+                log.info(f"Checked {done}/{count}, dead found: {dead}")
         
         headers = {
             "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
@@ -259,33 +333,34 @@ class ProductManager:
             "Referer": "https://www.wildberries.ru/",
         }
         
-        timeout = aiohttp.ClientTimeout(total=10)
+        timeout = aiohttp.ClientTimeout(total=CLEANUP_REQUEST_TIMEOUT_SEC)
+        connector = aiohttp.TCPConnector(limit=CLEANUP_CONCURRENCY, limit_per_host=CLEANUP_PER_HOST)
+        semaphore = asyncio.Semaphore(CLEANUP_CONCURRENCY)
+
+        async def _check(session: aiohttp.ClientSession, external_id: str) -> None:
+            nonlocal checked, unknown
+            try:
+                async with semaphore:
+                    alive = await self._image_alive_with_retry(session, build_image_url(int(external_id)))
+                if alive is False:
+                    dead_ids.append(external_id)
+                elif alive is None:
+                    unknown += 1
+            except Exception as e:
+                unknown += 1
+                log.warning(f"Error checking {external_id}: {e}")
+            finally:
+                checked += 1
+                if checked % progress_every == 0 or checked == total:
+                    progress(checked, total, len(dead_ids))
         
-        async with aiohttp.ClientSession(headers=headers, timeout=timeout) as session:
-            for i in range(0, len(all_ids), batch_size):
+        async with aiohttp.ClientSession(headers=headers, timeout=timeout, connector=connector) as session:
+            for i in range(0, total, batch_size):
                 batch = all_ids[i:i + batch_size]
-                
-                for external_id in batch:
-                    try:
-                        nm_id = int(external_id)
-                        vol = nm_id // 100_000
-                        part = nm_id // 1_000
-                        basket = self._get_basket_number(vol)
-                        
-                        url = f"https://basket-{basket:02d}.wbbasket.ru/vol{vol}/part{part}/{nm_id}/images/big/1.webp"
-                        
-                        async with session.get(url) as resp:
-                            if resp.status != 200:
-                                dead_ids.append(external_id)
-                                
-                    except Exception as e:
-                        log.warning(f"Error checking {external_id}: {e}")
-                
-                checked = min(i + batch_size, len(all_ids))
-                if checked % 500 == 0 or checked == len(all_ids):
-                    log.info(f"Checked {checked}/{len(all_ids)}, dead found: {len(dead_ids)}")
-                
-                await asyncio.sleep(0.1)
+                await asyncio.gather(*(_check(session, eid) for eid in batch))
+        
+        if unknown:
+            log.warning(f"Cleanup: {unknown} products without a definite answer, kept")
         
         if dead_ids:
             removed = await self.remove_products(platform, dead_ids)
@@ -295,7 +370,42 @@ class ProductManager:
         log.info("Cleanup complete: no dead products found")
         return 0, []
 
-    
+    @classmethod
+    async def _image_alive_with_retry(cls, session: aiohttp.ClientSession, url: str) -> bool | None:
+        """_image_alive с повторами (экспоненциальная пауза) для неопределённых ответов."""
+        for attempt in range(CLEANUP_MAX_RETRIES + 1):
+            try:
+                alive = await cls._image_alive(session, url)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                alive = None
+            if alive is not None:
+                return alive
+            if attempt < CLEANUP_MAX_RETRIES:
+                await asyncio.sleep(CLEANUP_RETRY_BASE_SEC * (2 ** attempt))
+        return None
+
+    @staticmethod
+    async def _image_alive(session: aiohttp.ClientSession, url: str) -> bool | None:
+        """
+        Есть ли картинка по URL — без скачивания тела.
+
+        True — есть, False — удалена (404/410), None — не понять (429, 5xx и т.п.).
+        """
+        async with session.head(url, allow_redirects=True) as resp:
+            status = resp.status
+
+        if status in (403, 405, 501):
+            # HEAD не поддержан — запрашиваем один байт
+            async with session.get(url, headers={"Range": "bytes=0-0"}) as resp:
+                status = resp.status
+            if status == 206:
+                return True
+
+        if status == 200:
+            return True
+        if status in DEAD_STATUSES:
+            return False
+        return None
 
     async def import_from_csv(
         self,
@@ -383,23 +493,6 @@ class ProductManager:
             await session.commit()
             return res.rowcount or 0
 
-    def _get_basket_number(self, vol: int) -> int:
-        """Определяет номер basket по vol."""
-        ranges = [
-            (143, 1), (287, 2), (431, 3), (719, 4), (1007, 5),
-            (1061, 6), (1115, 7), (1169, 8), (1313, 9), (1601, 10),
-            (1655, 11), (1919, 12), (2045, 13), (2189, 14), (2405, 15),
-            (2621, 16), (2837, 17), (3053, 18), (3269, 19), (3485, 20),
-            (3701, 21), (3917, 22), (4133, 23), (4349, 24), (4565, 25),
-            (4899, 26), (5399, 27), (5599, 28), (5859, 29), (6259, 30),
-            (6459, 31), (6659, 32), (6859, 33), (7059, 34), (7259, 35),
-            (7459, 36), (7659, 37), (7859, 38), (8059, 39), (8259, 40),
-        ]
-        for max_vol, basket in ranges:
-            if vol <= max_vol:
-                return basket
-        return 41
-
     async def _get_or_create_platform(self, session: AsyncSession, code: PlatformCode) -> Platform:
         """Получает или создаёт платформу."""
         stmt = select(Platform).where(Platform.code == code)
@@ -462,4 +555,7 @@ class ProductManager:
             )
             await session.commit()
 
-            return res.rowcount or 0, list(dead_ids)
\ No newline at end of file
+        cache = get_search_cache()
+        if cache.forget(PlatformCode.OZON.value, dead_ids):
+            await cache.flush()
+        return res.rowcount or 0, list(dead_ids)
\ No newline at end of file
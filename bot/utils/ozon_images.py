@@ -0,0 +1,161 @@
+# bot/utils/ozon_images.py
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any
+
+log = logging.getLogger(__name__)
+
+OZON_CDP_URL = os.getenv("OZON_CDP_URL", "http://localhost:9222").strip()
+OZON_IMAGE_BROWSER_TIMEOUT_MS = int(os.getenv("OZON_IMAGE_BROWSER_TIMEOUT_MS", "15000"))
+# Кэш product_url -> image_url (неудачи кэшируются короче, чтобы повторить позже)
+OZON_IMAGE_CACHE_SIZE = int(os.getenv("OZON_IMAGE_CACHE_SIZE", "2000"))
+OZON_IMAGE_CACHE_TTL_SEC = float(os.getenv("OZON_IMAGE_CACHE_TTL_SEC", "86400"))
+OZON_IMAGE_MISS_TTL_SEC = float(os.getenv("OZON_IMAGE_MISS_TTL_SEC", "600"))
+
+_META_IMAGE_JS = """
+() => {
+    for (const sel of ["meta[property='og:image']", "meta[name='twitter:image']"]) {
+        const el = document.querySelector(sel);
+        if (el && el.content && el.content.trim()) return el.content.trim();
+    }
+    return null;
+}
+"""
+
+
+class OzonImageResolver:
+    """
+    Достаёт og:image/twitter:image со страницы товара OZON через браузер (CDP).
+
+    - одно подключение Playwright и своя вкладка на всё время жизни
+      (вкладки OzonParser не трогаем)
+    - навигации сериализуются lock'ом, повторы по тому же URL — из кэша
+    - если соединение/вкладка умерли — переподключается при следующем вызове
+    """
+
+    def __init__(self) -> None:
+        self._playwright = None
+        self._browser = None
+        self._page = None
+        self._lock: asyncio.Lock | None = None
+        self._cache: OrderedDict[str, tuple[str | None, float]] = OrderedDict()
+
+    async def resolve(self, product_url: str) -> str | None:
+        if not product_url:
+            return None
+
+        cached = self._cache_get(product_url)
+        if cached is not None:
+            return cached or None
+
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            # Пока ждали lock, другой вызов мог уже найти картинку
+            cached = self._cache_get(product_url)
+            if cached is not None:
+                return cached or None
+
+            image_url = await self._resolve_uncached(product_url)
+            self._cache_put(product_url, image_url)
+            return image_url
+
+    async def close(self) -> None:
+        try:
+            if self._page:
+                await self._page.close()
+        except Exception:
+            pass
+        try:
+            if self._playwright:
+                await self._playwright.stop()
+        except Exception:
+            pass
+
+        self._playwright = None
+        self._browser = None
+        self._page = None
+
+    # =========================================================================
+    # Внутреннее
+    # =========================================================================
+
+    async def _resolve_uncached(self, product_url: str) -> str | None:
+        try:
+            page = await self._ensure_page()
+            if page is None:
+                return None
+
+            await page.goto(product_url, wait_until="domcontentloaded", timeout=OZON_IMAGE_BROWSER_TIMEOUT_MS)
+            image_url = await page.evaluate(_META_IMAGE_JS)
+            return image_url if isinstance(image_url, str) and image_url else None
+
+        except Exception as e:
+            log.debug("OZON image resolve failed for %s: %s", product_url, e)
+            return None
+
+    async def _ensure_page(self) -> Any:
+        if self._page is not None and not self._page.is_closed() and self._browser and self._browser.is_connected():
+            return self._page
+
+        await self.close()
+
+        # гарантируем, что Chrome запущен на CDP порту
+        from bot.utils.chrome_manager import ensure_chrome_running
+
+        if not await ensure_chrome_running():
+            return None
+
+        from playwright.async_api import async_playwright
+
+        self._playwright = await async_playwright().start()
+        self._browser = await self._playwright.chromium.connect_over_cdp(OZON_CDP_URL)
+        context = self._browser.contexts[0] if self._browser.contexts else await self._browser.new_context()
+        self._page = await context.new_page()
+        log.info("OZON image resolver: browser page ready")
+        return self._page
+
+    def _cache_get(self, product_url: str) -> str | None:
+        """None — нет в кэше, "" — закэширована неудача."""
+        entry = self._cache.get(product_url)
+        if entry is None:
+            return None
+
+        image_url, expires_at = entry
+        if time.monotonic() >= expires_at:
+            del self._cache[product_url]
+            return None
+
+        self._cache.move_to_end(product_url)
+        return image_url or ""
+
+    def _cache_put(self, product_url: str, image_url: str | None) -> None:
+        ttl = OZON_IMAGE_CACHE_TTL_SEC if image_url else OZON_IMAGE_MISS_TTL_SEC
+        self._cache[product_url] = (image_url, time.monotonic() + ttl)
+        self._cache.move_to_end(product_url)
+        while len(self._cache) > OZON_IMAGE_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+
+_resolver: OzonImageResolver | None = None
+
+
+def get_ozon_image_resolver() -> OzonImageResolver:
+    global _resolver
+    if _resolver is None:
+        _resolver = OzonImageResolver()
+    return _resolver
+
+
+async def close_ozon_image_resolver() -> None:
+    global _resolver
+    if _resolver:
+        await _resolver.close()
+        _resolver = None
@@ -0,0 +1,89 @@
+# bot/utils/rate_limiter.py
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import time
+
+log = logging.getLogger(__name__)
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket с адаптивной скоростью (AIMD).
+
+    - acquire() ждёт свободный токен (rate токенов в секунду, запас до burst)
+    - on_throttle() — ответ 429/498/5xx: скорость умножается на decrease_factor
+    - on_success() — после increase_after успешных ответов подряд скорость растёт на increase_step
+    """
+
+    def __init__(
+        self,
+        *,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        burst: int = 1,
+        decrease_factor: float = 0.5,
+        increase_step: float = 0.25,
+        increase_after: int = 20,
+        name: str = "limiter",
+    ) -> None:
+        self._min_rate = max(0.01, min_rate)
+        self._max_rate = max(self._min_rate, max_rate)
+        self._rate = min(max(rate, self._min_rate), self._max_rate)
+        self._burst = max(1, burst)
+        self._decrease_factor = decrease_factor
+        self._increase_step = increase_step
+        self._increase_after = max(1, increase_after)
+        self._name = name
+
+        self._tokens = float(self._burst)
+        self._updated = time.monotonic()
+        self._ok_streak = 0
+        self._lock: asyncio.Lock | None = None
+
+    @property
+    def rate(self) -> float:
+        return self._rate
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self._burst, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    async def acquire(self) -> None:
+        """Ждёт, пока в bucket появится токен, и забирает его."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            while True:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def on_success(self) -> None:
+        self._ok_streak += 1
+        if self._ok_streak < self._increase_after:
+            return
+
+        self._ok_streak = 0
+        if self._rate < self._max_rate:
+            self._refill()
+            self._rate = min(self._max_rate, self._rate + self._increase_step)
+            log.debug("%s: rate increased to %.2f req/s", self._name, self._rate)
+
+    def on_throttle(self) -> None:
+        self._ok_streak = 0
+        self._refill()
+        old_rate = self._rate
+        self._rate = max(self._min_rate, self._rate * self._decrease_factor)
+        # Сжигаем накопленный запас, чтобы не продолжать залп
+        self._tokens = min(self._tokens, 0.0)
+
+        if self._rate < old_rate:
+            log.warning("%s: throttled, rate %.2f -> %.2f req/s", self._name, old_rate, self._rate)
@@ -0,0 +1,194 @@
+# bot/utils/search_cache.py
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Iterable
+
+log = logging.getLogger(__name__)
+
+SEARCH_CACHE_FILE = Path(os.getenv("SEARCH_CACHE_FILE", ".search_cache.json"))
+# Сколько живёт выдача по запросу; потом обход начинается заново с первой страницы
+SEARCH_CACHE_TTL_HOURS = float(os.getenv("SEARCH_CACHE_TTL_HOURS", "24"))
+
+
+@dataclass
+class SearchEntry:
+    """
+    Уже просмотренная выдача одного запроса.
+
+    ids — артикулы в порядке выдачи, cursor — следующая неизведанная
+    страница, next_path — её адрес, если площадка отдаёт курсор
+    (OZON nextPage), exhausted — выдача закончилась.
+    """
+
+    ids: list[str] = field(default_factory=list)
+    cursor: int = 1
+    exhausted: bool = False
+    next_path: str | None = None
+    created_at: float = field(default_factory=time.time)
+    # То же, что ids, для проверки дублей без пересборки множества
+    known: set[str] = field(default_factory=set, repr=False, compare=False)
+
+    def __post_init__(self) -> None:
+        self.known = set(self.ids)
+
+    def is_stale(self, now: float) -> bool:
+        return now - self.created_at >= SEARCH_CACHE_TTL_HOURS * 3600
+
+
+class SearchCache:
+    """
+    Персистентный кэш поисковой выдачи для добора товаров.
+
+    Добор каждый раз просит одни и те же запросы, а почти все найденные
+    артикулы уже есть в БД. Кэш помнит, что уже видели и докуда дошли:
+    сначала отдаём известные артикулы, потом продолжаем с cursor.
+
+    Изменения копятся в памяти; на диск их пишет flush() — в конце
+    обхода и в отдельном потоке, чтобы не блокировать event loop.
+    """
+
+    def __init__(self, path: Path | None = SEARCH_CACHE_FILE) -> None:
+        self._path = path
+        self._entries: dict[str, SearchEntry] = {}
+        self._dirty = False
+        self._save_lock = asyncio.Lock()
+        self._load()
+
+    @staticmethod
+    def key(platform: str, query: str, *extra: str) -> str:
+        return "|".join([platform, query.strip().lower(), *extra])
+
+    def entry(self, key: str) -> SearchEntry:
+        """Запись по ключу; протухшая запись сбрасывается."""
+        entry = self._entries.get(key)
+        if entry is None or entry.is_stale(time.time()):
+            entry = SearchEntry()
+            self._entries[key] = entry
+        return entry
+
+    def extend(
+        self,
+        key: str,
+        ids: list[str],
+        cursor: int,
+        exhausted: bool = False,
+        next_path: str | None = None,
+    ) -> None:
+        """Дописывает новые артикулы и сдвигает cursor (и next_path вместе с ним)."""
+        entry = self.entry(key)
+        for item in ids:
+            item = str(item)
+            if item not in entry.known:
+                entry.known.add(item)
+                entry.ids.append(item)
+        if cursor > entry.cursor:
+            entry.next_path = next_path
+        entry.cursor = max(entry.cursor, cursor)
+        entry.exhausted = entry.exhausted or exhausted
+        self._dirty = True
+
+    def forget(self, platform: str, ids: Iterable[str]) -> int:
+        """
+        Убирает артикулы из всех выдач платформы.
+
+        Удалённый из БД товар иначе вернулся бы добором прямо из кэша
+        (до истечения TTL) — и снова был бы удалён.
+        """
+        drop = {str(x) for x in ids}
+        if not drop:
+            return 0
+        prefix = f"{platform.lower()}|"
+        removed = 0
+        for key, entry in self._entries.items():
+            if not key.startswith(prefix):
+                continue
+            if entry.known.isdisjoint(drop):
+                continue
+            kept = [x for x in entry.ids if x not in drop]
+            removed += len(entry.ids) - len(kept)
+            entry.ids = kept
+            entry.known -= drop
+        if removed:
+            self._dirty = True
+        return removed
+
+    async def flush(self) -> None:
+        """Пишет накопленные изменения на диск (в потоке)."""
+        if not self._path:
+            return
+        async with self._save_lock:
+            if not self._dirty:
+                return
+            # Снимок — в event loop, пока его не меняют; запись — в потоке
+            data = self._snapshot()
+            self._dirty = False
+            if not await asyncio.to_thread(self._write, data):
+                self._dirty = True
+
+    # =========================================================================
+    # Внутреннее
+    # =========================================================================
+
+    def _load(self) -> None:
+        if not self._path or not self._path.exists():
+            return
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+            now = time.time()
+            for key, raw in (data.get("entries") or {}).items():
+                entry = SearchEntry(
+                    ids=[str(x) for x in raw.get("ids") or []],
+                    cursor=int(raw.get("cursor") or 1),
+                    exhausted=bool(raw.get("exhausted")),
+                    next_path=raw.get("next_path") or None,
+                    created_at=float(raw.get("created_at") or 0),
+                )
+                if not entry.is_stale(now):
+                    self._entries[key] = entry
+            if self._entries:
+                log.info("Search cache: loaded %d queries from %s", len(self._entries), self._path)
+        except Exception as e:
+            log.warning("Failed to load search cache from %s: %s", self._path, e)
+
+    def _snapshot(self) -> dict:
+        now = time.time()
+        entries = {
+            key: {
+                "ids": list(e.ids),
+                "cursor": e.cursor,
+                "exhausted": e.exhausted,
+                "next_path": e.next_path,
+                "created_at": e.created_at,
+            }
+            for key, e in self._entries.items()
+            if not e.is_stale(now)
+        }
+        return {"entries": entries}
+
+    def _write(self, data: dict) -> bool:
+        try:
+            tmp = self._path.with_suffix(self._path.suffix + ".tmp")
+            tmp.write_text(json.dumps(data), encoding="utf-8")
+            tmp.replace(self._path)
+            return True
+        except Exception as e:
+            log.warning("Failed to save search cache to %s: %s", self._path, e)
+            return False
+
+
+_search_cache: SearchCache | None = None
+
+
+def get_search_cache() -> SearchCache:
+    global _search_cache
+    if _search_cache is None:
+        _search_cache = SearchCache()
+    return _search_cache
@@ -0,0 +1,292 @@
+# bot/utils/wb_basket.py
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from collections.abc import Iterable
+from pathlib import Path
+
+import aiohttp
+
+log = logging.getLogger(__name__)
+
+# (max_vol, basket) — актуальная таблица WB
+DEFAULT_RANGES: list[tuple[int, int]] = [
+    (143, 1), (287, 2), (431, 3), (719, 4), (1007, 5),
+    (1061, 6), (1115, 7), (1169, 8), (1313, 9), (1601, 10),
+    (1655, 11), (1919, 12), (2045, 13), (2189, 14), (2405, 15),
+    (2621, 16), (2837, 17), (3053, 18), (3269, 19), (3485, 20),
+    (3701, 21), (3917, 22), (4133, 23), (4349, 24), (4565, 25),
+    (4899, 26), (5399, 27), (5599, 28), (5859, 29), (6259, 30),
+    (6459, 31), (6659, 32), (6859, 33), (7059, 34), (7259, 35),
+    (7459, 36), (7659, 37), (7859, 38), (8059, 39), (8259, 40),
+]
+FALLBACK_BASKET = 41
+
+# Выученные диапазоны vol -> basket для vol за пределами таблицы
+BASKETS_FILE = Path(os.getenv("WB_BASKETS_FILE", ".wb_baskets.json"))
+# Сколько basket-хостов пробовать выше последнего известного
+PROBE_SPAN = int(os.getenv("WB_BASKET_PROBE_SPAN", "12"))
+PROBE_TIMEOUT_SEC = float(os.getenv("WB_BASKET_PROBE_TIMEOUT_SEC", "5"))
+PROBE_CONCURRENCY = int(os.getenv("WB_BASKET_PROBE_CONCURRENCY", "32"))
+# Сколько разных nm_id одного vol пробовать (первый может оказаться удалённым)
+PROBE_SAMPLES = int(os.getenv("WB_BASKET_PROBE_SAMPLES", "3"))
+# Сколько не повторять поиск для vol, который не нашёлся
+PROBE_FAIL_TTL_SEC = float(os.getenv("WB_BASKET_PROBE_FAIL_TTL_SEC", "3600"))
+
+
+class BasketTable:
+    """
+    Таблица vol -> номер basket-NN.wbbasket.ru.
+
+    Поиск — bisect по верхним границам диапазонов + memo по vol.
+    Таблицу можно заменить на лету (refresh) и дополнить тем,
+    какой хост реально ответил (learn). Выученные диапазоны
+    (min_vol, max_vol) по каждому basket сохраняются на диск.
+    """
+
+    def __init__(
+        self,
+        ranges: Iterable[tuple[int, int]] = DEFAULT_RANGES,
+        path: Path | None = None,
+    ) -> None:
+        self._path = path
+        self._bounds: list[int] = []
+        self._baskets: list[int] = []
+        self._learned: dict[int, list[int]] = {}  # basket -> [min_vol, max_vol]
+        # Выученные диапазоны, отсортированные по min_vol (для bisect)
+        self._learned_lo: list[int] = []
+        self._learned_spans: list[tuple[int, int, int]] = []  # (min_vol, max_vol, basket)
+        self._memo: dict[int, int] = {}
+        self.refresh(ranges)
+        self._load()
+
+    def refresh(self, ranges: Iterable[tuple[int, int]]) -> None:
+        """Заменяет таблицу диапазонов (max_vol, basket)."""
+        pairs = sorted(ranges)
+        self._bounds = [max_vol for max_vol, _ in pairs]
+        self._baskets = [basket for _, basket in pairs]
+        self._memo.clear()
+
+    def learn(self, vol: int, basket: int) -> None:
+        """Запоминает basket, который реально отдал товар для vol."""
+        if self._learned_basket(vol) == basket or (self._in_table(vol) and self._table_basket(vol) == basket):
+            return
+
+        span = self._learned.get(basket)
+        if span is None:
+            self._learned[basket] = [vol, vol]
+        else:
+            span[0] = min(span[0], vol)
+            span[1] = max(span[1], vol)
+
+        log.info("WB basket learned: vol=%d -> basket-%02d", vol, basket)
+        self._reindex_learned()
+        self._memo.clear()
+        self._save()
+
+    def is_known(self, vol: int) -> bool:
+        """vol покрыт таблицей или выученным диапазоном (не нужно искать хост)."""
+        return self._in_table(vol) or self._learned_basket(vol) is not None
+
+    def lookup(self, vol: int) -> int:
+        basket = self._memo.get(vol)
+        if basket is not None:
+            return basket
+
+        basket = self._learned_basket(vol)
+        if basket is None:
+            basket = self._table_basket(vol) if self._in_table(vol) else self._nearest_basket(vol)
+
+        self._memo[vol] = basket
+        return basket
+
+    def probe_candidates(self, vol: int) -> list[int]:
+        """Basket-хосты, среди которых стоит искать неизвестный vol."""
+        start = self._nearest_basket(vol)
+        return list(range(max(1, start - 1), start + PROBE_SPAN))
+
+    # =========================================================================
+    # Внутреннее
+    # =========================================================================
+
+    def _in_table(self, vol: int) -> bool:
+        return bool(self._bounds) and vol <= self._bounds[-1]
+
+    def _table_basket(self, vol: int) -> int:
+        return self._baskets[bisect.bisect_left(self._bounds, vol)]
+
+    def _learned_basket(self, vol: int) -> int | None:
+        # Диапазоны basket'ов идут по vol подряд — кандидат один: последний с min_vol <= vol
+        i = bisect.bisect_right(self._learned_lo, vol)
+        if i == 0:
+            return None
+        _lo, hi, basket = self._learned_spans[i - 1]
+        return basket if vol <= hi else None
+
+    def _reindex_learned(self) -> None:
+        self._learned_spans = sorted((lo, hi, basket) for basket, (lo, hi) in self._learned.items())
+        self._learned_lo = [lo for lo, _hi, _basket in self._learned_spans]
+
+    def _nearest_basket(self, vol: int) -> int:
+        """Лучшее предположение: максимальный известный basket для меньших vol."""
+        best = FALLBACK_BASKET if not self._in_table(vol) else self._table_basket(vol)
+        for basket, (lo, _hi) in self._learned.items():
+            if lo <= vol and basket > best:
+                best = basket
+        return best
+
+    def _load(self) -> None:
+        if not self._path or not self._path.exists():
+            return
+        try:
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+            for lo, hi, basket in data.get("ranges") or []:
+                self._learned[int(basket)] = [int(lo), int(hi)]
+            self._reindex_learned()
+            if self._learned:
+                log.info("WB baskets: loaded %d learned ranges from %s", len(self._learned), self._path)
+        except Exception as e:
+            log.warning("Failed to load WB baskets from %s: %s", self._path, e)
+
+    def _save(self) -> None:
+        if not self._path:
+            return
+        try:
+            ranges = sorted([lo, hi, basket] for basket, (lo, hi) in self._learned.items())
+            tmp = self._path.with_suffix(self._path.suffix + ".tmp")
+            tmp.write_text(json.dumps({"ranges": ranges}), encoding="utf-8")
+            tmp.replace(self._path)
+        except Exception as e:
+            log.warning("Failed to save WB baskets to %s: %s", self._path, e)
+
+
+_table = BasketTable(path=BASKETS_FILE)
+_discovering: dict[int, asyncio.Task] = {}
+# vol -> monotonic-время, до которого не искать повторно (поиск не удался)
+_failed: dict[int, float] = {}
+# Общая сессия для проб: поиск vol переживает вызов, который его запустил
+_probe_session: aiohttp.ClientSession | None = None
+
+
+def get_basket_table() -> BasketTable:
+    return _table
+
+
+def get_basket_number(vol: int) -> int:
+    """Определяет номер basket по vol."""
+    return _table.lookup(vol)
+
+
+def build_image_base(nm_id: int) -> str:
+    """URL каталога с картинками товара (без имени файла)."""
+    vol = nm_id // 100_000
+    part = nm_id // 1_000
+    basket = get_basket_number(vol)
+    return f"https://basket-{basket:02d}.wbbasket.ru/vol{vol}/part{part}/{nm_id}/images/big"
+
+
+def build_image_url(nm_id: int, index: int = 1, ext: str = "webp") -> str:
+    return f"{build_image_base(nm_id)}/{index}.{ext}"
+
+
+# =============================================================================
+# Поиск basket для новых vol
+# =============================================================================
+
+def _get_probe_session() -> aiohttp.ClientSession:
+    global _probe_session
+    if _probe_session is None or _probe_session.closed:
+        _probe_session = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=PROBE_TIMEOUT_SEC),
+            connector=aiohttp.TCPConnector(limit=PROBE_CONCURRENCY),
+        )
+    return _probe_session
+
+
+async def close_basket_probe_session() -> None:
+    """Закрывает сессию проб basket (вызывать при остановке бота)."""
+    global _probe_session
+    if _probe_session is not None and not _probe_session.closed:
+        await _probe_session.close()
+    _probe_session = None
+
+
+async def _probe(session: aiohttp.ClientSession, basket: int, nm_id: int) -> int | None:
+    vol = nm_id // 100_000
+    part = nm_id // 1_000
+    url = f"https://basket-{basket:02d}.wbbasket.ru/vol{vol}/part{part}/{nm_id}/info/ru/card.json"
+    try:
+        async with session.head(url, allow_redirects=True) as resp:
+            return basket if resp.status == 200 else None
+    except Exception:
+        return None
+
+
+async def _discover(vol: int, nm_ids: list[int]) -> int | None:
+    """Ищет basket для vol: по очереди для каждого nm_id, кандидатов — параллельно."""
+    session = _get_probe_session()
+    for nm_id in nm_ids:
+        tasks = [asyncio.create_task(_probe(session, b, nm_id)) for b in _table.probe_candidates(vol)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                basket = await fut
+                if basket is not None:
+                    _table.learn(vol, basket)
+                    _failed.pop(vol, None)
+                    return basket
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    _failed[vol] = time.monotonic() + PROBE_FAIL_TTL_SEC
+    log.warning("WB basket not found for vol=%d (tried nm_ids %s)", vol, nm_ids)
+    return None
+
+
+async def ensure_baskets_known(nm_ids: Iterable[int]) -> set[int]:
+    """
+    Для vol, которых нет ни в таблице, ни в выученных диапазонах,
+    параллельно опрашивает кандидатов basket-NN и запоминает победителя.
+
+    На vol пробуется до PROBE_SAMPLES разных nm_id; неудача запоминается
+    на PROBE_FAIL_TTL_SEC, чтобы не повторять пробы на каждом вызове.
+    Возвращает vol, которые так и остались неизвестными.
+    """
+    now = time.monotonic()
+    samples: dict[int, list[int]] = {}
+    unresolved: set[int] = set()
+    for nm_id in nm_ids:
+        vol = int(nm_id) // 100_000
+        if _table.is_known(vol):
+            continue
+        if _failed.get(vol, 0) > now:
+            unresolved.add(vol)
+            continue
+        picked = samples.setdefault(vol, [])
+        if len(picked) < PROBE_SAMPLES and int(nm_id) not in picked:
+            picked.append(int(nm_id))
+
+    if not samples:
+        return unresolved
+
+    waits = []
+    for vol, nm_list in samples.items():
+        # Один поиск на vol, даже если его запросили параллельно несколько задач
+        task = _discovering.get(vol)
+        if task is None or task.done():
+            task = asyncio.create_task(_discover(vol, nm_list))
+            _discovering[vol] = task
+            task.add_done_callback(lambda _t, v=vol: _discovering.pop(v, None))
+        waits.append(task)
+
+    # shield: отмена одного ожидающего не должна отменять общий поиск для остальных
+    await asyncio.gather(*(asyncio.shield(t) for t in waits), return_exceptions=True)
+
+    unresolved.update(vol for vol in samples if not _table.is_known(vol))
+    return unresolved
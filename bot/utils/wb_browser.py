@@ -0,0 +1,185 @@
+# bot/utils/wb_browser.py
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+log = logging.getLogger(__name__)
+
+WB_HOME_URL = "https://www.wildberries.ru/"
+
+# По умолчанию с окном, как и прежний uc.Chrome: headless антибот WB видит иначе
+BROWSER_HEADLESS = os.getenv("WB_BROWSER_HEADLESS", "false").lower() in ("true", "1", "yes")
+# Первичная загрузка: ждём, пока антибот WB выставит cookies
+BROWSER_WARMUP_SEC = float(os.getenv("WB_BROWSER_WARMUP_SEC", "5"))
+# Перезагрузка открытой вкладки перед выдачей cookies, если она старше N минут
+BROWSER_RELOAD_MIN = float(os.getenv("WB_BROWSER_RELOAD_MIN", "30"))
+BROWSER_RELOAD_WAIT_SEC = float(os.getenv("WB_BROWSER_RELOAD_WAIT_SEC", "2"))
+
+
+# MV3-расширение, которое отвечает на запрос авторизации прокси:
+# Chrome не принимает логин/пароль в --proxy-server
+_PROXY_AUTH_MANIFEST = {
+    "manifest_version": 3,
+    "name": "wb-proxy-auth",
+    "version": "1.0",
+    "permissions": ["webRequest", "webRequestAuthProvider"],
+    "host_permissions": ["<all_urls>"],
+    "background": {"service_worker": "background.js"},
+}
+_PROXY_AUTH_JS = """
+const credentials = %s;
+chrome.webRequest.onAuthRequired.addListener(
+    (details, callback) => callback(details.isProxy ? {authCredentials: credentials} : {}),
+    {urls: ["<all_urls>"]},
+    ["asyncBlocking"]
+);
+"""
+
+
+def browser_proxy_supported(proxy: str | None) -> bool:
+    """Может ли браузер ходить через этот прокси (SOCKS с паролем Chrome не умеет)."""
+    if not proxy:
+        return True
+    parts = urlsplit(proxy)
+    return not (parts.username and parts.scheme.startswith("socks"))
+
+
+def _proxy_server_and_auth(proxy: str) -> tuple[str, dict[str, str] | None]:
+    """Прокси для --proxy-server (без логина) и логин/пароль отдельно."""
+    parts = urlsplit(proxy)
+    if not parts.username:
+        return proxy, None
+
+    server = f"{parts.scheme}://{parts.hostname}" + (f":{parts.port}" if parts.port else "")
+    auth = {"username": unquote(parts.username), "password": unquote(parts.password or "")}
+    return server, auth
+
+
+def _write_proxy_auth_extension(auth: dict[str, str]) -> Path:
+    path = Path(tempfile.mkdtemp(prefix="wb_proxy_auth_"))
+    (path / "manifest.json").write_text(json.dumps(_PROXY_AUTH_MANIFEST), encoding="utf-8")
+    (path / "background.js").write_text(_PROXY_AUTH_JS % json.dumps(auth), encoding="utf-8")
+    return path
+
+
+class WBBrowser:
+    """
+    Долгоживущий браузер для cookies WB.
+
+    Держит открытую вкладку wildberries.ru и отдаёт cookies из её jar
+    без холодного старта Chrome. Перезапускается только если упал.
+    Все вызовы блокирующие (Selenium) и сериализуются внутренним lock —
+    из async-кода вызывать через asyncio.to_thread.
+
+    Прокси с логином/паролем (http/https) подключается через маленькое
+    расширение, которое отвечает на запрос авторизации: cookies получаются
+    с того же IP, с которого потом идут запросы.
+    """
+
+    def __init__(
+        self,
+        *,
+        headless: bool = BROWSER_HEADLESS,
+        proxy: str | None = None,
+        user_agent: str | None = None,
+    ) -> None:
+        self._headless = headless
+        self._proxy = proxy
+        self._user_agent = user_agent
+        self._driver = None
+        self._loaded_at: float = 0.0
+        self._extension_dir: Path | None = None
+        self._lock = threading.Lock()
+
+    def get_cookies(self, force_reload: bool = False) -> dict[str, str]:
+        """Cookies из открытой вкладки (перезагружает её, если она устарела или force_reload)."""
+        with self._lock:
+            self._ensure_alive()
+
+            age_min = (time.monotonic() - self._loaded_at) / 60
+            if force_reload or age_min >= BROWSER_RELOAD_MIN:
+                self._driver.refresh()
+                time.sleep(BROWSER_RELOAD_WAIT_SEC)
+                self._loaded_at = time.monotonic()
+
+            cookies = {}
+            for cookie in self._driver.get_cookies():
+                cookies[cookie['name']] = cookie['value']
+            return cookies
+
+    def close(self) -> None:
+        with self._lock:
+            self._quit()
+
+    def _ensure_alive(self) -> None:
+        if self._driver is not None:
+            try:
+                # Дешёвая проверка, что процесс и сессия живы
+                _ = self._driver.current_url
+                return
+            except Exception as e:
+                log.warning("WB browser is dead (%s), restarting", e)
+                self._quit()
+
+        self._start()
+
+    def _start(self) -> None:
+        import undetected_chromedriver as uc
+
+        log.info("Starting WB browser (headless=%s)...", self._headless)
+
+        # Расширение от прошлой неудачной попытки старта
+        self._remove_extension()
+
+        options = uc.ChromeOptions()
+        options.add_argument("--no-sandbox")
+        options.add_argument("--disable-dev-shm-usage")
+        if self._proxy:
+            server, auth = _proxy_server_and_auth(self._proxy)
+            options.add_argument(f"--proxy-server={server}")
+            if auth:
+                self._extension_dir = _write_proxy_auth_extension(auth)
+                options.add_argument(f"--load-extension={self._extension_dir}")
+        if self._user_agent:
+            options.add_argument(f"--user-agent={self._user_agent}")
+
+        driver = uc.Chrome(options=options, headless=self._headless)
+        try:
+            driver.get(WB_HOME_URL)
+            time.sleep(BROWSER_WARMUP_SEC)
+        except Exception:
+            try:
+                driver.quit()
+            except Exception:
+                pass
+            self._remove_extension()
+            raise
+
+        self._driver = driver
+        self._loaded_at = time.monotonic()
+        log.info("WB browser ready")
+
+    def _quit(self) -> None:
+        if self._driver is None:
+            return
+        try:
+            self._driver.quit()
+        except Exception:
+            pass
+        self._driver = None
+        self._loaded_at = 0.0
+        self._remove_extension()
+
+    def _remove_extension(self) -> None:
+        if self._extension_dir is not None:
+            shutil.rmtree(self._extension_dir, ignore_errors=True)
+            self._extension_dir = None
@@ -0,0 +1,189 @@
+# bot/utils/wb_cookies.py
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from collections.abc import Callable
+from datetime import datetime, timedelta
+from pathlib import Path
+
+log = logging.getLogger(__name__)
+
+COOKIES_REFRESH_HOURS = float(os.getenv("WB_COOKIES_REFRESH_HOURS", "2"))
+# Обновляем заранее, за N минут до истечения, чтобы запросы не ждали браузер
+COOKIES_REFRESH_MARGIN_MIN = float(os.getenv("WB_COOKIES_REFRESH_MARGIN_MIN", "15"))
+COOKIES_RETRY_SEC = float(os.getenv("WB_COOKIES_RETRY_SEC", "60"))
+COOKIES_WAIT_TIMEOUT_SEC = float(os.getenv("WB_COOKIES_WAIT_TIMEOUT_SEC", "120"))
+COOKIES_FILE = Path(os.getenv("WB_COOKIES_FILE", ".wb_cookies.json"))
+
+
+class WBCookieStore:
+    """
+    Общее хранилище cookies WB для парсера карточек и поиска по каталогу.
+
+    - фоновая задача обновляет cookies заранее, до истечения срока
+    - источник — fetcher(force_reload), обычно WBBrowser.get_cookies (без холодного старта)
+    - cookies сохраняются на диск, после рестарта браузер не нужен сразу
+    - wait_ready() — awaitable-сигнал «cookies готовы»: запросы ждут событие,
+      а не запуск браузера
+    """
+
+    def __init__(
+        self,
+        fetcher: Callable[[bool], dict[str, str]],
+        path: Path = COOKIES_FILE,
+    ) -> None:
+        self._path = path
+        self._fetcher = fetcher
+
+        self._cookies: dict[str, str] = {}
+        self._updated: datetime | None = None
+        # После 498 страницу в браузере нужно перезагрузить, а не просто перечитать jar
+        self._force_reload = False
+
+        self._ready: asyncio.Event | None = None
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+        self._load()
+
+    # =========================================================================
+    # Публичный API
+    # =========================================================================
+
+    @property
+    def cookies(self) -> dict[str, str]:
+        return self._cookies
+
+    def start(self) -> None:
+        """Запускает фоновое обновление (идемпотентно)."""
+        self._ensure_events()
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run(), name="wb-cookie-refresher")
+
+    async def wait_ready(self, timeout: float | None = COOKIES_WAIT_TIMEOUT_SEC) -> dict[str, str]:
+        """Ждёт готовые cookies. Возвращает {} если не дождались."""
+        self.start()
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            log.warning("WB cookies not ready after %.0f sec", timeout or 0)
+            return {}
+        return self._cookies
+
+    def invalidate(self) -> None:
+        """Cookies отвергнуты сервером (498) — сбрасываем и просим обновить."""
+        self._ensure_events()
+        if not self._ready.is_set():
+            return
+
+        log.warning("WB cookies invalidated, scheduling refresh")
+        self._cookies = {}
+        self._updated = None
+        self._force_reload = True
+        self._ready.clear()
+        self._wakeup.set()
+
+    async def close(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    # =========================================================================
+    # Внутреннее
+    # =========================================================================
+
+    def _ensure_events(self) -> None:
+        if self._ready is None:
+            self._ready = asyncio.Event()
+            self._wakeup = asyncio.Event()
+            if self._cookies and not self._is_expired():
+                self._ready.set()
+
+    def _age(self) -> timedelta | None:
+        if not self._updated:
+            return None
+        return datetime.now() - self._updated
+
+    def _is_expired(self) -> bool:
+        age = self._age()
+        return age is None or age >= timedelta(hours=COOKIES_REFRESH_HOURS)
+
+    def _seconds_until_refresh(self) -> float:
+        age = self._age()
+        if age is None or not self._cookies:
+            return 0.0
+        due = timedelta(hours=COOKIES_REFRESH_HOURS) - timedelta(minutes=COOKIES_REFRESH_MARGIN_MIN)
+        return max(0.0, (due - age).total_seconds())
+
+    async def _run(self) -> None:
+        while True:
+            delay = self._seconds_until_refresh()
+            if delay > 0:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            if await self._refresh():
+                continue
+
+            # Не получилось — старые cookies (если ещё не протухли) остаются в ходу
+            if self._cookies and not self._is_expired():
+                self._ready.set()
+            await asyncio.sleep(COOKIES_RETRY_SEC)
+
+    async def _refresh(self) -> bool:
+        log.info("Refreshing WB cookies from browser...")
+        try:
+            cookies = await asyncio.to_thread(self._fetcher, self._force_reload)
+        except Exception as e:
+            log.error("Failed to get WB cookies: %s", e)
+            return False
+
+        if not cookies:
+            log.error("Failed to get WB cookies: empty cookie jar")
+            return False
+
+        self._cookies = cookies
+        self._updated = datetime.now()
+        self._force_reload = False
+        self._ready.set()
+        self._save()
+
+        log.info("WB cookies refreshed, count: %d", len(cookies))
+        return True
+
+    def _load(self) -> None:
+        try:
+            if not self._path.exists():
+                return
+            data = json.loads(self._path.read_text(encoding="utf-8"))
+            cookies = data.get("cookies") or {}
+            updated = data.get("updated")
+            if cookies and updated:
+                self._cookies = {str(k): str(v) for k, v in cookies.items()}
+                self._updated = datetime.fromtimestamp(float(updated))
+                log.info("WB cookies loaded from %s (age: %s)", self._path, self._age())
+        except Exception as e:
+            log.warning("Failed to load WB cookies from %s: %s", self._path, e)
+
+    def _save(self) -> None:
+        try:
+            tmp = self._path.with_suffix(self._path.suffix + ".tmp")
+            tmp.write_text(
+                json.dumps({"updated": self._updated.timestamp(), "cookies": self._cookies}),
+                encoding="utf-8",
+            )
+            tmp.replace(self._path)
+        except Exception as e:
+            log.warning("Failed to save WB cookies to %s: %s", self._path, e)
@@ -0,0 +1,45 @@
+# bot/utils/wb_http.py
+
+from __future__ import annotations
+
+import os
+
+import aiohttp
+
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 30
+POOL_SIZE = int(os.getenv("WB_POOL_SIZE", "20"))  # Keep-alive соединений в пуле
+
+_session: aiohttp.ClientSession | None = None
+
+
+def _create_session() -> aiohttp.ClientSession:
+    # Один keep-alive пул на все запросы к WB (карточки и поиск)
+    connector = aiohttp.TCPConnector(
+        limit=POOL_SIZE,
+        limit_per_host=POOL_SIZE,
+        ttl_dns_cache=300,
+        keepalive_timeout=60,
+    )
+    timeout = aiohttp.ClientTimeout(sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT)
+    # Cookies передаём явно от identity — общий jar смешал бы сессии
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        cookie_jar=aiohttp.DummyCookieJar(),
+    )
+
+
+def get_wb_session() -> aiohttp.ClientSession:
+    global _session
+    if _session is None or _session.closed:
+        _session = _create_session()
+    return _session
+
+
+async def close_wb_session() -> None:
+    """Закрывает общий HTTP-пул WB (вызывать при остановке бота)."""
+    global _session
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
@@ -0,0 +1,216 @@
+# bot/utils/wb_identities.py
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+from collections.abc import AsyncIterator
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from pathlib import Path
+
+from bot.utils.rate_limiter import AdaptiveRateLimiter
+from bot.utils.wb_browser import WBBrowser, browser_proxy_supported
+from bot.utils.wb_cookies import COOKIES_FILE, WBCookieStore
+
+log = logging.getLogger(__name__)
+
+# ============================================================================
+# Настройки
+# ============================================================================
+
+DEFAULT_USER_AGENTS = [
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36",
+]
+
+# Прокси: WB_PROXY_URLS (через запятую) или один WB_PROXY_URL
+WB_PROXY_URLS = [
+    p.strip()
+    for p in (os.getenv("WB_PROXY_URLS") or os.getenv("WB_PROXY_URL", "")).split(",")
+    if p.strip()
+]
+# User-Agent'ы через "|" (внутри UA бывают запятые)
+WB_USER_AGENTS = [ua.strip() for ua in os.getenv("WB_USER_AGENTS", "").split("|") if ua.strip()] or DEFAULT_USER_AGENTS
+# Количество identity: по умолчанию по одному на прокси
+IDENTITY_COUNT = int(os.getenv("WB_IDENTITY_COUNT", "0")) or max(1, len(WB_PROXY_URLS))
+
+# Адаптивный лимит запросов (token bucket) на каждую identity
+RATE_PER_SEC = float(os.getenv("WB_RATE_PER_SEC", "2.0"))
+RATE_MIN_PER_SEC = float(os.getenv("WB_RATE_MIN_PER_SEC", "0.2"))
+RATE_MAX_PER_SEC = float(os.getenv("WB_RATE_MAX_PER_SEC", "10.0"))
+RATE_BURST = int(os.getenv("WB_RATE_BURST", "4"))
+RATE_INCREASE_AFTER = int(os.getenv("WB_RATE_INCREASE_AFTER", "20"))
+
+# Штрафной бокс для identity, получившей 498/429
+PENALTY_BASE_SEC = float(os.getenv("WB_IDENTITY_PENALTY_SEC", "30"))
+PENALTY_MAX_SEC = float(os.getenv("WB_IDENTITY_PENALTY_MAX_SEC", "600"))
+
+PENALTY_STATUSES = (429, 498)
+THROTTLE_STATUSES = (429, 498, 500, 502, 503, 504)
+
+
+@dataclass
+class WBIdentity:
+    """Независимая «личность» для запросов к WB: cookies, UA, прокси, лимит."""
+
+    name: str
+    user_agent: str
+    proxy: str | None
+    cookies: WBCookieStore
+    browser: WBBrowser
+    limiter: AdaptiveRateLimiter
+    in_flight: int = 0
+    strikes: int = 0
+    penalty_until: float = 0.0
+
+    def is_penalized(self, now: float) -> bool:
+        return now < self.penalty_until
+
+
+class WBIdentityPool:
+    """
+    Пул identity для WB.
+
+    - lease() выдаёт наименее загруженную identity вне штрафного бокса
+    - report() учитывает ответ: лимитер, штраф за 498/429, сброс cookies на 498
+    """
+
+    def __init__(self, identities: list[WBIdentity]) -> None:
+        if not identities:
+            raise ValueError("WBIdentityPool requires at least one identity")
+        self._identities = identities
+
+    @property
+    def identities(self) -> list[WBIdentity]:
+        return self._identities
+
+    def start(self) -> None:
+        """Запускает фоновое обновление cookies всех identity."""
+        for identity in self._identities:
+            identity.cookies.start()
+
+    async def acquire(self) -> WBIdentity:
+        while True:
+            now = time.monotonic()
+            available = [i for i in self._identities if not i.is_penalized(now)]
+            if available:
+                identity = min(available, key=lambda i: i.in_flight)
+                identity.in_flight += 1
+                return identity
+
+            wait = min(i.penalty_until for i in self._identities) - now
+            log.warning("WB: all identities penalized, waiting %.0f sec", wait)
+            await asyncio.sleep(max(0.1, wait))
+
+    def release(self, identity: WBIdentity) -> None:
+        identity.in_flight = max(0, identity.in_flight - 1)
+
+    @asynccontextmanager
+    async def lease(self) -> AsyncIterator[WBIdentity]:
+        identity = await self.acquire()
+        try:
+            yield identity
+        finally:
+            self.release(identity)
+
+    def report(self, identity: WBIdentity, status: int) -> None:
+        if status == 200:
+            identity.limiter.on_success()
+            identity.strikes = 0
+            return
+
+        if status in THROTTLE_STATUSES:
+            identity.limiter.on_throttle()
+
+        if status == 498:
+            identity.cookies.invalidate()
+
+        if status in PENALTY_STATUSES:
+            # Штраф — чтобы запросы ушли на другие identity; если других нет,
+            # бокс остановил бы весь пул — тогда хватает замедления лимитера и backoff
+            now = time.monotonic()
+            if not any(i is not identity and not i.is_penalized(now) for i in self._identities):
+                log.warning("WB identity %s: HTTP %d, no other identity available, throttling only", identity.name, status)
+                return
+
+            identity.strikes += 1
+            penalty = min(PENALTY_MAX_SEC, PENALTY_BASE_SEC * (2 ** (identity.strikes - 1)))
+            identity.penalty_until = now + penalty
+            log.warning(
+                "WB identity %s: HTTP %d, penalty %.0f sec (strike %d)",
+                identity.name, status, penalty, identity.strikes,
+            )
+
+    async def close(self) -> None:
+        for identity in self._identities:
+            await identity.cookies.close()
+            await asyncio.to_thread(identity.browser.close)
+
+
+def _cookies_path(index: int) -> Path:
+    if index == 0:
+        return COOKIES_FILE
+    return COOKIES_FILE.with_name(f"{COOKIES_FILE.stem}_{index}{COOKIES_FILE.suffix}")
+
+
+def _build_identities() -> list[WBIdentity]:
+    identities: list[WBIdentity] = []
+    skipped: list[str] = []
+
+    for i in range(IDENTITY_COUNT):
+        proxy = WB_PROXY_URLS[i % len(WB_PROXY_URLS)] if WB_PROXY_URLS else None
+        user_agent = WB_USER_AGENTS[i % len(WB_USER_AGENTS)]
+        name = f"wb-{i}"
+
+        # Cookies должны получаться с того же IP, что и запросы, — иначе identity не изолирована
+        if not browser_proxy_supported(proxy):
+            log.error("WB identity %s skipped: browser cannot use proxy %s (SOCKS with auth)", name, proxy.split("@")[-1])
+            skipped.append(proxy.split("@")[-1])
+            continue
+
+        browser = WBBrowser(proxy=proxy, user_agent=user_agent)
+        identities.append(WBIdentity(
+            name=name,
+            user_agent=user_agent,
+            proxy=proxy,
+            cookies=WBCookieStore(browser.get_cookies, path=_cookies_path(i)),
+            browser=browser,
+            limiter=AdaptiveRateLimiter(
+                rate=RATE_PER_SEC,
+                min_rate=RATE_MIN_PER_SEC,
+                max_rate=RATE_MAX_PER_SEC,
+                burst=RATE_BURST,
+                increase_after=RATE_INCREASE_AFTER,
+                name=name,
+            ),
+        ))
+
+    if not identities:
+        # Молча ходить напрямую нельзя: прокси заданы, чтобы не светить свой IP
+        raise ValueError(
+            "WB: no usable identities - the browser cannot use any of the proxies "
+            f"({', '.join(sorted(set(skipped)))}): SOCKS proxies with auth are not supported, "
+            "use HTTP(S) proxies in WB_PROXY_URLS"
+        )
+
+    return identities
+
+
+_identity_pool: WBIdentityPool | None = None
+
+
+def get_identity_pool() -> WBIdentityPool:
+    global _identity_pool
+    if _identity_pool is None:
+        _identity_pool = WBIdentityPool(_build_identities())
+        log.info("WB identity pool: %d identities, %d proxies", len(_identity_pool.identities), len(WB_PROXY_URLS))
+    return _identity_pool
+
+
+async def close_identity_pool() -> None:
+    global _identity_pool
+    if _identity_pool:
+        await _identity_pool.close()
+        _identity_pool = None
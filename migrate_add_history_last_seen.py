@@ -0,0 +1,31 @@
+# migrate_add_history_last_seen.py
+"""
+Миграция: добавление last_seen_at в таблицу price_history
+(нужно для PRICE_HISTORY_COMPRESSED=true).
+Бот делает то же самое при старте (init_db), скрипт — для ручного запуска.
+Запустить один раз: python migrate_add_history_last_seen.py
+БД берётся из DATABASE_DSN (PostgreSQL или SQLite), по умолчанию ./parser.db.
+"""
+
+import asyncio
+import os
+
+from bot.db import create_engine
+from bot.db.init import add_missing_columns
+
+
+async def migrate():
+    engine = create_engine(os.getenv("DATABASE_DSN", "sqlite+aiosqlite:///./parser.db"))
+
+    async with engine.begin() as conn:
+        added = await add_missing_columns(conn)
+        for column in added:
+            print(f"Added {column}")
+
+        print("Migration complete!")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())